@@ -5,68 +5,364 @@
 """Generate the necessary data files and directory structures from the Debian
 project's data."""
 
+import argparse
+import ast
+import concurrent.futures
 import glob
+import hashlib
+import json
 import os.path
+import re
 import shutil
+import struct
 import subprocess
+import sys
 
 REVISION = "v4.18.0"
 
 data_dir = "parts/data"
 base_dir = os.path.join("src", "pycountry")
+database_dir = os.path.join(base_dir, "databases")
+locales_dir = os.path.join(base_dir, "locales")
 
-if not os.path.exists(data_dir):
-    subprocess.check_call(
-        [
-            "git",
-            "clone",
-            "https://salsa.debian.org/iso-codes-team/iso-codes.git",
-            data_dir,
-        ]
-    )
+# Remembers the hashes of the sources of the generated files to skip
+# unchanged ones on the next run.
+manifest_file = os.path.join(".cache", "generate.json")
 
-subprocess.check_call(["git", "-C", data_dir, "fetch"])
-subprocess.check_call(["git", "-C", data_dir, "checkout", REVISION])
+STANDARDS = ["639-3", "639-5", "3166-1", "3166-2", "3166-3", "4217", "15924"]
 
 
-assert os.path.exists(base_dir), "pycountry src directory not found"
-assert os.path.exists(data_dir), "pkg-isocodes data directory not found"
+def checkout(data_dir):
+    if not os.path.exists(data_dir):
+        subprocess.check_call(
+            [
+                "git",
+                "clone",
+                "https://salsa.debian.org/iso-codes-team/iso-codes.git",
+                data_dir,
+            ]
+        )
 
-database_dir = os.path.join(base_dir, "databases")
-locales_dir = os.path.join(base_dir, "locales")
+    subprocess.check_call(["git", "-C", data_dir, "fetch"])
+    subprocess.check_call(["git", "-C", data_dir, "checkout", REVISION])
 
 
-STANDARDS = ["639-3", "639-5", "3166-1", "3166-2", "3166-3", "4217", "15924"]
+def file_hash(path, compiler=""):
+    digest = hashlib.sha256(compiler.encode())
+    with open(path, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_manifest():
+    try:
+        with open(manifest_file, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def parse_po(path):
+    """Return the translated messages of a PO file as a dict, keyed like
+    GNU msgfmt does for message contexts and plural forms.
+
+    Fuzzy entries are skipped, except for the header, which carries the
+    charset needed to read the catalog.
+
+    """
+    messages = {}
+    entry = {}
+    fuzzy = False
+    keyword = None
+
+    def add():
+        if "msgid" not in entry or (fuzzy and entry["msgid"]):
+            return
+        msgid = entry["msgid"]
+        if "msgid_plural" in entry:
+            msgid += "\0" + entry["msgid_plural"]
+            forms = [k for k in entry if k.startswith("msgstr[")]
+            forms.sort(key=lambda k: int(k[7:-1]))
+            msgstr = "\0".join(entry[k] for k in forms)
+        else:
+            msgstr = entry.get("msgstr", "")
+        if "msgctxt" in entry:
+            msgid = entry["msgctxt"] + "\x04" + msgid
+        # Untranslated messages are left out.
+        if msgstr.strip("\0"):
+            messages[msgid] = msgstr
+
+    def complete():
+        return any(k.startswith("msgstr") for k in entry)
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                # Comments (including obsolete entries) precede the next
+                # entry.
+                if complete():
+                    add()
+                    entry, fuzzy = {}, False
+                if line.startswith("#,") and "fuzzy" in line:
+                    fuzzy = True
+                continue
+            if line.startswith('"'):
+                # Continuation of the previous string
+                entry[keyword] += ast.literal_eval(line)
+                continue
+            keyword, _, value = line.partition(" ")
+            if keyword in ("msgctxt", "msgid") and complete():
+                add()
+                entry, fuzzy = {}, False
+            entry[keyword] = ast.literal_eval(value.strip())
+    add()
+    return messages
+
+
+def write_mo(messages, path):
+    """Write messages to a GNU MO file (without hash table)."""
+    keys = sorted(messages, key=lambda k: k.encode("utf-8"))
+    ids = [k.encode("utf-8") for k in keys]
+    strs = [messages[k].encode("utf-8") for k in keys]
+
+    # The header is followed by the tables of (length, offset) pairs for
+    # the original and translated strings, then the strings themselves.
+    count = len(keys)
+    originals_offset = 7 * 4
+    translations_offset = originals_offset + count * 8
+    data_offset = translations_offset + count * 8
+
+    tables = []
+    data = []
+    offset = data_offset
+    for strings in ids, strs:
+        table = []
+        for string in strings:
+            table.append((len(string), offset))
+            data.append(string + b"\0")
+            offset += len(string) + 1
+        tables.append(table)
+
+    with open(path, "wb") as f:
+        f.write(
+            struct.pack(
+                "<7I",
+                0x950412DE,
+                0,
+                count,
+                originals_offset,
+                translations_offset,
+                0,
+                data_offset,
+            )
+        )
+        for table in tables:
+            for length, offset in table:
+                f.write(struct.pack("<2I", length, offset))
+        f.write(b"".join(data))
+
+
+def compile_catalog(src, dst, compiler):
+    if compiler == "python":
+        write_mo(parse_po(src), dst)
+    else:
+        subprocess.check_call([compiler, src, "-o", dst])
+    return src, dst
 
-# Put the database files in place
-if not os.path.exists(database_dir):
-    os.mkdir(database_dir)
 
-for standard in STANDARDS:
-    src = os.path.join(data_dir, "data", "iso_%s.json" % standard)
-    print(src)
-    dst = os.path.join(database_dir, "iso%s.json" % standard)
-    shutil.copyfile(src, dst)
+def subdivision_offsets(path):
+    """Return the byte range of each country's entries in the ISO 3166-2
+    database, which allows loading the subdivisions of single countries."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    separator = re.compile(r"[\s,]*")
 
+    # Positions are counted in characters while decoding, but seeking in the
+    # file needs bytes.
+    char_pos = byte_pos = 0
 
-# Put the PO files in place and compile them
-for standard in STANDARDS:
-    for src in glob.glob(os.path.join(data_dir, f"iso_{standard}", "*.po")):
-        print(src)
-        dir, locale = os.path.split(src)
-        locale = locale.replace(".po", "")
+    def to_bytes(pos):
+        nonlocal char_pos, byte_pos
+        byte_pos += len(text[char_pos:pos].encode("utf-8"))
+        char_pos = pos
+        return byte_pos
+
+    offsets = {}
+    pos = text.index("[", text.index('"3166-2"')) + 1
+    while True:
+        pos = separator.match(text, pos).end()
+        if text[pos] == "]":
+            break
+        entry, end = decoder.raw_decode(text, pos)
+        country_code = entry["code"].split("-")[0]
+        start = to_bytes(pos)
+        offsets.setdefault(country_code, [start, None])[1] = to_bytes(end)
+        pos = end
+    return {"size": to_bytes(len(text)), "countries": offsets}
+
+
+def write_subdivision_offsets(src, dst):
+    print(src + " -> " + dst)
+    with open(dst, "w", encoding="utf-8") as f:
+        json.dump(subdivision_offsets(src), f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def copy_databases(data_dir, manifest):
+    if not os.path.exists(database_dir):
+        os.mkdir(database_dir)
+
+    for standard in STANDARDS:
+        src = os.path.join(data_dir, "data", "iso_%s.json" % standard)
+        dst = os.path.join(database_dir, "iso%s.json" % standard)
+        digest = file_hash(src)
+        if manifest.get(dst) != digest or not os.path.exists(dst):
+            print(src + " -> " + dst)
+            shutil.copyfile(src, dst)
+            manifest[dst] = digest
+
+        if standard == "3166-2":
+            offsets = dst.replace(".json", ".offsets.json")
+            if manifest.get(offsets) != digest or not os.path.exists(offsets):
+                write_subdivision_offsets(dst, offsets)
+                manifest[offsets] = digest
+
+
+def write_sqlite(manifest):
+    """Build the SQLite file of the databases for the SQLite backend."""
+    dst = os.path.join(database_dir, "pycountry.sqlite")
+    # The file depends on the databases as well as on how they are indexed:
+    # the index building in db.py, the search index, the fields of each
+    # database in __init__.py and the schema.
+    sources = sorted(glob.glob(os.path.join(database_dir, "*.json")))
+    sources += [
+        os.path.join(base_dir, "__init__.py"),
+        os.path.join(base_dir, "db.py"),
+        os.path.join(base_dir, "search.py"),
+        os.path.join(base_dir, "sqlite.py"),
+    ]
+    digest = hashlib.sha256(
+        "".join(file_hash(src) for src in sources).encode()
+    ).hexdigest()
+    if manifest.get(dst) == digest and os.path.exists(dst):
+        return
+
+    sys.path.insert(0, os.path.dirname(base_dir))
+    import pycountry.sqlite
+
+    print("Building " + dst)
+    pycountry.sqlite.build(dst)
+    manifest[dst] = digest
+
+
+def compile_catalogs(data_dir, manifest, compiler, jobs):
+    tasks = []
+    expected = set()
+    for standard in STANDARDS:
+        for src in glob.glob(os.path.join(data_dir, f"iso_{standard}", "*.po")):
+            locale = os.path.basename(src).replace(".po", "")
+            dst_dir = os.path.join(locales_dir, locale, "LC_MESSAGES")
+            os.makedirs(dst_dir, exist_ok=True)
+            dst = os.path.join(dst_dir, "iso%s.mo" % standard)
+            expected.add(dst)
+
+            digest = file_hash(src, compiler)
+            if manifest.get(dst) == digest and os.path.exists(dst):
+                continue
+            tasks.append((src, dst, digest))
+
+    # Remove catalogs that are not part of the data anymore.
+    for dst in glob.glob(os.path.join(locales_dir, "*", "LC_MESSAGES", "*")):
+        if dst not in expected:
+            print("Removing " + dst)
+            os.unlink(dst)
+            manifest.pop(dst, None)
+    # Along with the directories of locales that are gone completely.
+    for dst_dir in glob.glob(os.path.join(locales_dir, "*", "LC_MESSAGES")):
+        if not os.listdir(dst_dir):
+            print("Removing " + os.path.dirname(dst_dir))
+            os.rmdir(dst_dir)
+            if not os.listdir(os.path.dirname(dst_dir)):
+                os.rmdir(os.path.dirname(dst_dir))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(compile_catalog, src, dst, compiler): digest
+            for src, dst, digest in tasks
+        }
+        for future in concurrent.futures.as_completed(futures):
+            src, dst = future.result()
+            print(src + " -> " + dst)
+            manifest[dst] = futures[future]
+
+    print(
+        f"Compiled {len(tasks)} catalogs, "
+        f"{len(expected) - len(tasks)} unchanged."
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--data-dir",
+        default=data_dir,
+        help="iso-codes checkout to use (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=f"use the data directory as is instead of checking out "
+        f"{REVISION}",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count(),
+        help="number of catalogs to compile in parallel",
+    )
+    parser.add_argument(
+        "--python-msgfmt",
+        dest="compiler",
+        action="store_const",
+        const="python",
+        # Fall back to compiling in Python if msgfmt isn't installed.
+        default="msgfmt" if shutil.which("msgfmt") else "python",
+        help="compile the MO files in Python instead of calling msgfmt",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="regenerate all files even if their sources are unchanged",
+    )
+    args = parser.parse_args(argv)
 
-        dst_dir = os.path.join(locales_dir, locale, "LC_MESSAGES")
-        if not os.path.exists(dst_dir):
-            os.makedirs(dst_dir)
+    if not args.offline:
+        checkout(args.data_dir)
 
-        dst = os.path.join(dst_dir, "iso%s.po" % standard)
-        dst_mo = dst.replace(".po", ".mo")
+    assert os.path.exists(base_dir), "pycountry src directory not found"
+    assert os.path.exists(
+        args.data_dir
+    ), "pkg-isocodes data directory not found"
 
-        shutil.copyfile(src, dst)
-        print(src + " -> " + dst)
-        subprocess.check_call(["msgfmt", dst, "-o", dst_mo])
-        os.unlink(dst)
+    manifest = {} if args.force else load_manifest()
+    try:
+        copy_databases(args.data_dir, manifest)
+        write_sqlite(manifest)
+        compile_catalogs(args.data_dir, manifest, args.compiler, args.jobs)
+    finally:
+        save_manifest(manifest)
 
 
-# Generate the MO files.
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 """pycountry"""
 
+import json
 import os.path
-import unicodedata
 from importlib import metadata as _importlib_metadata
 from importlib import resources as _importlib_resources
-from typing import Optional, cast
+from typing import Optional
 
 import pycountry.db
+import pycountry.history
+import pycountry.tags
+from pycountry.search import remove_accents
 
 
 def resource_filename(package_or_requirement: str, resource_name: str) -> str:
@@ -28,93 +31,99 @@ DATABASE_DIR: str = resource_filename("pycountry", "databases")
 __version__: Optional[str] = get_version("pycountry")
 
 
-def remove_accents(input_str: str) -> str:
-    output_str = input_str
-    if not input_str.isascii():
-        # Borrowed from https://stackoverflow.com/a/517974/1509718
-        nfkd_form = unicodedata.normalize("NFKD", input_str)
-        output_str = "".join(
-            [c for c in nfkd_form if not unicodedata.combining(c)]
-        )
-    return output_str
-
-
 class ExistingCountries(pycountry.db.Database[pycountry.db.Country]):
     """Provides access to an ISO 3166 database (Countries)."""
 
     data_class = pycountry.db.Country
     root_key = "3166-1"
+    search_fields = ["name", "official_name", "common_name", "comment"]
+    code_fields = ["alpha_2", "alpha_3", "numeric"]
+
+    def _subdivision_tier(self, results, points=None):
+        """Return a tier of the countries of scored subdivisions, optionally
+        with fixed `points` per subdivision.
+
+        `results` scores all subdivisions, or only the given ones. The tier's
+        bound is the most points a single country gets from it. Both are
+        computed on first use only.
+
+        """
+        matches = None
+
+        def countries_of(scored):
+            found = []
+            for subdivision, score in scored:
+                country = self.get(alpha_2=subdivision.country_code)
+                if country is not None:
+                    found.append((country, points or score))
+            return found
+
+        def get_matches(records=None):
+            nonlocal matches
+            if records is not None and matches is None:
+                # Unless all matches are known already (e.g. for the bound),
+                # only search the subdivisions of the given countries.
+                return countries_of(
+                    results(
+                        [
+                            subdivision
+                            for country in records
+                            for subdivision in subdivisions.get(
+                                country_code=country.alpha_2
+                            )
+                            or ()
+                        ]
+                    )
+                )
+            if matches is None:
+                matches = countries_of(results(None))
+            return matches
+
+        def bound():
+            totals = {}
+            for country, score in get_matches():
+                totals[country] = totals.get(country, 0) + score
+            return max(totals.values(), default=0)
+
+        return bound, get_matches
+
+    def _fuzzy_tiers(self, query, max_distance):
+        # Countries collect points for each of their matching subdivisions.
+        return [
+            # Prio 1: exact matches on country names
+            (50, lambda records: self._exact_results(query, records)),
+            # Prio 2: exact matches on subdivision names
+            self._subdivision_tier(
+                lambda records: subdivisions._exact_results(query, records),
+                points=49,
+            ),
+            # Prio 3: partial matches on country names
+            (40, lambda records: self._partial_results(query, records)),
+            # Prio 4: partial matches on subdivision names
+            self._subdivision_tier(
+                lambda records: subdivisions._partial_results(query, records)
+            ),
+            # Prio 5 and 6: typo-tolerant matches on country names, then on
+            # subdivision names.
+            (
+                6 if max_distance else 0,
+                lambda records: self._typo_results(
+                    query, max_distance, records
+                ),
+            ),
+            self._subdivision_tier(
+                lambda records: subdivisions._typo_results(
+                    query, max_distance, records
+                )
+            ),
+        ]
 
-    def search_fuzzy(self, query: str) -> list[pycountry.db.Country]:
-        query = remove_accents(query.strip().lower())
-
-        # A country-code to points mapping for later sorting countries
-        # based on the query's matching incidence.
-        results: dict[str, int] = {}
-
-        def add_result(country: "pycountry.db.Country", points: int) -> None:
-            results.setdefault(country.alpha_2, 0)
-            results[country.alpha_2] += points
-
-        # Prio 1: exact matches on country names
-        try:
-            add_result(self.lookup(query), 50)
-        except LookupError:
-            pass
+    def _fuzzy_sort_key(self, country):
+        return country.alpha_2
 
-        # Prio 2: exact matches on subdivision names
-        match_subdivions = pycountry.Subdivisions.match(
-            self=subdivisions, query=query
-        )
-        for candidate in match_subdivions:
-            add_result(candidate.country, 49)
-
-        # Prio 3: partial matches on country names
-        for candidate in self:
-            # Higher priority for a match on the common name
-            for v in [
-                candidate._fields.get("name"),
-                candidate._fields.get("official_name"),
-                candidate._fields.get("comment"),
-            ]:
-                if v is not None:
-                    # Check for initials match
-                    initials = "".join([c for c in v if c.isupper()])
-                    if query == remove_accents(initials.lower()):
-                        add_result(candidate, 40)
-                        break
-                    v = remove_accents(v.lower())
-                    if query in v:
-                        # This prefers countries with a match early in their name
-                        # and also balances against countries with a number of
-                        # partial matches and their name containing 'new' in the
-                        # middle
-                        add_result(
-                            candidate, max([5, 30 - (2 * v.find(query))])
-                        )
-                        break
-
-        # Prio 4: partial matches on subdivision names
-        partial_match_subdivisions = pycountry.Subdivisions.partial_match(
-            self=subdivisions, query=query
-        )
-        for candidate in partial_match_subdivisions:
-            v = candidate._fields.get("name")
-            v = remove_accents(v.lower())
-            if query in v:
-                add_result(candidate.country, max([1, 5 - v.find(query)]))
-
-        if not results:
-            raise LookupError(query)
-
-        sorted_results = [
-            self.get(alpha_2=x[0])
-            # sort by points first, by alpha2 code second, and to ensure stable
-            # results the negative value allows us to sort reversely on the
-            # points but ascending on the country code.
-            for x in sorted(results.items(), key=lambda x: (-x[1], x[0]))
-        ]
-        return cast(list[pycountry.db.Country], sorted_results)
+    def _cache_version(self):
+        # Searches match subdivisions, too.
+        return (self._generation, subdivisions._generation)
 
 
 class HistoricCountries(ExistingCountries):
@@ -124,6 +133,50 @@ class HistoricCountries(ExistingCountries):
     data_class = pycountry.db.Country
     root_key = "3166-3"
 
+    def __init__(self, filename):
+        super().__init__(filename)
+        self._resolutions = None
+
+    def _get_resolutions(self):
+        resolutions = self._resolutions
+        if resolutions is None or resolutions[0] != (
+            countries._generation,
+            self._generation,
+        ):
+            index = pycountry.history.resolution_index(countries, self)
+            # Loading the databases changes their generations, too.
+            version = (countries._generation, self._generation)
+            resolutions = self._resolutions = (version, index)
+        return resolutions[1]
+
+    def resolve(self, code, default=None):
+        """Resolve a current or withdrawn country code of any code system
+        (e.g. "DE", "YU", "ANHH" or 891).
+
+        Returns a `CodeResolution` with the current countries the code stands
+        for and the withdrawn country, or `default` for unknown codes.
+
+        """
+        if type(code) is int:
+            code = "%03d" % code
+        if not isinstance(code, str):
+            return default
+        return self._get_resolutions().get(code.lower(), default)
+
+    def resolve_many(self, codes, default=None):
+        """Resolve many codes at once, see `resolve`."""
+        resolutions = self._get_resolutions()
+        results = []
+        append = results.append
+        for code in codes:
+            if type(code) is int:
+                code = "%03d" % code
+            if isinstance(code, str):
+                append(resolutions.get(code.lower(), default))
+            else:
+                append(default)
+        return results
+
 
 class Scripts(pycountry.db.Database):
     """Provides access to an ISO 15924 database (Scripts)."""
@@ -137,12 +190,18 @@ class Currencies(pycountry.db.Database):
 
     data_class = "Currency"
     root_key = "4217"
+    code_fields = ["alpha_3", "numeric"]
 
 
 class Languages(pycountry.db.Database):
     """Provides access to an ISO 639-1/2T/3 database (Languages)."""
 
     no_index = ["status", "scope", "type", "inverted_name", "common_name"]
+    search_fields = ["name", "common_name", "inverted_name"]
+    # ISO 639-1, 639-3 (which includes 639-2/T) and 639-2/B codes. Only the
+    # languages whose bibliographic code differs have one in the database.
+    code_fields = ["alpha_2", "alpha_3", "bibliographic"]
+    code_fallbacks = {"bibliographic": "alpha_3"}
 
     data_class = "Language"
     root_key = "639-3"
@@ -154,6 +213,7 @@ class LanguageFamilies(pycountry.db.Database):
 
     data_class = "LanguageFamily"
     root_key = "639-5"
+    code_fields = ["alpha_3"]
 
 
 class SubdivisionHierarchy(pycountry.db.Data):
@@ -190,8 +250,79 @@ class Subdivisions(pycountry.db.Database):
     no_index = ["name", "parent_code", "parent", "type"]
     root_key = "3166-2"
 
+    def __init__(self, filename):
+        super().__init__(filename)
+        # Byte ranges of each country's entries in the database file, which
+        # allow looking up the subdivisions of a country without loading all
+        # of them. Generated along with the database.
+        self.offsets_filename = os.path.splitext(filename)[0] + ".offsets.json"
+        self._offsets = None
+        # Subdivisions loaded per country before the whole database
+        self._shards = {}
+        self._loaded_shards = {}
+
+    def _get_offsets(self):
+        if self._offsets is None:
+            offsets = {}
+            try:
+                with open(self.offsets_filename, encoding="utf-8") as f:
+                    data = json.load(f)
+                # Don't trust offsets generated for another version of the
+                # database.
+                if data["size"] == os.path.getsize(self.filename):
+                    offsets = {
+                        code.lower(): span
+                        for code, span in data["countries"].items()
+                    }
+            except (OSError, ValueError, KeyError):
+                pass
+            self._offsets = offsets
+        return self._offsets
+
+    def _get_shard(self, country_code):
+        """Return the subdivisions of a country by lowercase code, loading
+        only that country's entries, or `None` if the whole database needs to
+        be used instead."""
+        country_code = country_code.lower()
+        with self._load_lock:
+            if self._is_loaded:
+                return None
+            shard = self._shards.get(country_code)
+            if shard is not None:
+                return shard
+            offsets = self._get_offsets()
+            if not offsets:
+                return None
+            shard = {}
+            if country_code in offsets:
+                start, end = offsets[country_code]
+                with open(self.filename, "rb") as f:
+                    f.seek(start)
+                    chunk = f.read(end - start)
+                for entry in json.loads(b"[" + chunk + b"]"):
+                    obj = self.factory(**entry)
+                    if obj.country_code.lower() == country_code:
+                        shard[obj.code.lower()] = obj
+            self._shards[country_code] = shard
+            return shard
+
+    def _make_record(self, entry):
+        # Reuse the records already handed out for single countries.
+        shard = self._loaded_shards.get(entry["code"].split("-")[0].lower())
+        if shard:
+            obj = shard.get(entry["code"].lower())
+            if obj is not None:
+                return obj
+        return super()._make_record(entry)
+
     def _load(self, *args, **kw):
-        super()._load(*args, **kw)
+        if self._is_loaded:
+            return
+        self._loaded_shards, self._shards = self._shards, {}
+        try:
+            super()._load(*args, **kw)
+        finally:
+            self._loaded_shards = {}
 
         # Add index for the country code.
         self.indices["country_code"] = {}
@@ -203,7 +334,20 @@ class Subdivisions(pycountry.db.Database):
 
     def get(self, **kw):
         default = kw.setdefault("default", None)
-        subdivisions = super().get(**kw)
+        shard = None
+        criteria = [field for field in kw if field != "default"]
+        if criteria in (["code"], ["country_code"]) and not self._is_loaded:
+            value = kw[criteria[0]]
+            if isinstance(value, str):
+                # Looking up a single country's subdivisions doesn't need
+                # the whole database.
+                shard = self._get_shard(value.split("-")[0])
+        if shard is None:
+            subdivisions = super().get(**kw)
+        elif "code" in kw:
+            subdivisions = shard.get(kw["code"].lower(), default)
+        else:
+            subdivisions = set(shard.values()) or default
         if subdivisions is default and "country_code" in kw:
             # This handles the case where we know about a country but there
             # are no subdivisions: we return an empty list in this case
@@ -212,70 +356,65 @@ class Subdivisions(pycountry.db.Database):
                 return []
         return subdivisions
 
+    def _index_record(self, index, obj):
+        # Exact matches consider all fields, partial matches only the name.
+        index.add(
+            obj,
+            [obj._fields.get("name")],
+            aliases=[v for v in obj._fields.values() if v is not None],
+            group=obj.country_code,
+        )
+
     def match(self, query):
         query = remove_accents(query.strip().lower())
-        matching_candidates = []
-        for candidate in subdivisions:
-            for v in candidate._fields.values():
-                if v is not None:
-                    v = remove_accents(v.lower())
-                    # Some names include alternative versions which we want to
-                    # match exactly.
-                    for w in v.split(";"):
-                        if w == query:
-                            matching_candidates.append(candidate)
-                            break
-
-        return matching_candidates
+        return self._get_search_index().exact_matches(query)
 
     def partial_match(self, query):
         query = remove_accents(query.strip().lower())
-        matching_candidates = []
-        for candidate in subdivisions:
-            v = candidate._fields.get("name")
-            v = remove_accents(v.lower())
-            if query in v:
-                matching_candidates.append(candidate)
-
-        return matching_candidates
-
-    def search_fuzzy(self, query: str) -> list[type["Subdivisions"]]:
-        query = remove_accents(query.strip().lower())
+        return [
+            candidate
+            for candidate, _ in self._get_search_index().partial_matches(
+                query, match_initials=False
+            )
+        ]
 
-        # A Subdivision's code to points mapping for later sorting subdivisions
-        # based on the query's matching incidence.
-        results: dict[str, int] = {}
-
-        def add_result(
-            subdivision: "pycountry.db.Subdivision", points: int
-        ) -> None:
-            results.setdefault(subdivision.code, 0)
-            results[subdivision.code] += points
-
-        # Prio 1: exact matches on subdivision names
-        match_subdivisions = self.match(query)
-        for candidate in match_subdivisions:
-            add_result(candidate, 50)
-
-        # Prio 2: partial matches on subdivision names
-        partial_match_subdivisions = self.partial_match(query)
-        for candidate in partial_match_subdivisions:
-            v = candidate._fields.get("name")
-            v = remove_accents(v.lower())
-            if query in v:
-                add_result(candidate, max([1, 5 - v.find(query)]))
-
-        if not results:
-            raise LookupError(query)
-
-        sorted_results = [
-            self.get(code=x[0])
-            # sort by points first, by alpha2 code second, and to ensure stable
-            # results the negative value allows us to sort reversely on the
-            # points but ascending on the country code.
-            for x in sorted(results.items(), key=lambda x: (-x[1], x[0]))
+    def _exact_results(self, query, records=None):
+        index = self._get_search_index_of(records)
+        for candidate in index.exact_matches(query):
+            yield candidate, 50
+
+    def _partial_results(self, query, records=None):
+        for candidate, position in self._get_search_index_of(
+            records
+        ).partial_matches(query, match_initials=False):
+            yield candidate, max([1, 5 - position])
+
+    def _typo_results(self, query, max_distance, records=None):
+        if not max_distance:
+            return
+        for distance, candidate in self._get_search_index_of(
+            records
+        ).typo_matches(query, max_distance):
+            if distance:
+                yield candidate, max([1, 3 - distance])
+
+    def _fuzzy_tiers(self, query, max_distance):
+        return [
+            # Prio 1: exact matches on subdivision names
+            (50, lambda records: self._exact_results(query, records)),
+            # Prio 2: partial matches on subdivision names
+            (5, lambda records: self._partial_results(query, records)),
+            # Prio 3: typo-tolerant matches on subdivision names
+            (
+                2 if max_distance else 0,
+                lambda records: self._typo_results(
+                    query, max_distance, records
+                ),
+            ),
         ]
-        return sorted_results
+
+    def _fuzzy_sort_key(self, subdivision):
+        return subdivision.code
 
 
 # Initialize instances with type hints
@@ -297,3 +436,18 @@ language_families: LanguageFamilies = LanguageFamilies(
 )
 
 scripts: Scripts = Scripts(os.path.join(DATABASE_DIR, "iso15924.json"))
+
+# Names of the database instances above
+DATABASES: list[str] = [
+    "countries",
+    "historic_countries",
+    "subdivisions",
+    "currencies",
+    "languages",
+    "language_families",
+    "scripts",
+]
+
+language_tags: pycountry.tags.LanguageTags = pycountry.tags.LanguageTags(
+    languages, scripts, countries, subdivisions
+)
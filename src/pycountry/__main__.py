@@ -0,0 +1,391 @@
+"""Command line interface, e.g. for normalizing columns of large files:
+
+python -m pycountry convert data.csv --column country --to alpha_2
+
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import json
+import os.path
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from typing import IO, Any, Callable, ContextManager, Optional
+
+import pycountry
+from pycountry import DATABASES
+from pycountry.codes import MEMO_SIZE
+from pycountry.search import MAX_TYPO_DISTANCE
+
+Resolver = Callable[[str], Optional[str]]
+
+
+def make_resolver(
+    database: str,
+    method: str,
+    field: Optional[str],
+    to: str,
+    max_distance: int = 0,
+) -> Resolver:
+    """Return a function resolving a value to the `to` attribute of the
+    matching record of a database, or `None`."""
+    db = getattr(pycountry, database)
+
+    def find(value: str) -> Any:
+        if method == "get":
+            return db.get(**{field or to: value})
+        if method == "lookup":
+            return db.lookup(value)
+        return db.search_fuzzy(str(value), max_distance, limit=1)[0]
+
+    def resolve(value: str) -> Optional[str]:
+        try:
+            record = find(value)
+        except LookupError:
+            return None
+        return getattr(record, to, None)
+
+    return resolve
+
+
+# The resolver of a worker process
+_resolve: Optional[Resolver] = None
+
+
+def _init_worker(*args: Any) -> None:
+    global _resolve
+    _resolve = make_resolver(*args)
+
+
+def _resolve_values(values: list[str]) -> list[Optional[str]]:
+    assert _resolve is not None
+    return [_resolve(value) for value in values]
+
+
+class Converter:
+    """Resolves the values of chunks of rows, remembering the results for a
+    (bounded) number of distinct values."""
+
+    def __init__(
+        self,
+        resolve: Resolver,
+        pool: Optional[concurrent.futures.Executor] = None,
+    ) -> None:
+        self.resolve = resolve
+        self.pool = pool
+        self.memo: dict[str, Optional[str]] = {}
+        # Values being resolved for chunks not finished yet
+        self.in_flight: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def missing(self, values: Iterable[str]) -> list[str]:
+        """Return the distinct values not resolved yet."""
+        missing: dict[str, None] = {}
+        for value in values:
+            if (
+                value in self.memo
+                or value in missing
+                or value in self.in_flight
+            ):
+                self.hits += 1
+            else:
+                self.misses += 1
+                missing[value] = None
+        self.in_flight.update(missing)
+        return list(missing)
+
+    def submit(self, values: list[str]) -> "concurrent.futures.Future":
+        if self.pool is not None:
+            return self.pool.submit(_resolve_values, values)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        future.set_result([self.resolve(value) for value in values])
+        return future
+
+    def remember(
+        self, values: list[str], results: list[Optional[str]]
+    ) -> dict[str, Optional[str]]:
+        found = dict(zip(values, results))
+        self.in_flight.difference_update(values)
+        if len(self.memo) < MEMO_SIZE:
+            self.memo.update(found)
+        return found
+
+    def result(
+        self, value: str, found: dict[str, Optional[str]]
+    ) -> Optional[str]:
+        """Return the result for a value of a finished chunk."""
+        if value in found:
+            return found[value]
+        if value in self.memo:
+            return self.memo[value]
+        # Resolved for another chunk, but the memo was full.
+        return self.resolve(value)
+
+
+class InputError(ValueError):
+    """The input can't be converted."""
+
+
+def chunked(rows: Iterator[Any], size: int) -> Iterator[list[Any]]:
+    while True:
+        chunk = [row for _, row in zip(range(size), rows)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def _value(row: dict[str, Any], column: str) -> Any:
+    """Return the value of `column` to resolve, or `None` if it is missing or
+    neither a string nor an integer."""
+    value = row.get(column)
+    if isinstance(value, (str, int)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def convert_rows(
+    rows: Iterator[dict[str, Any]],
+    column: str,
+    output_column: str,
+    default: Optional[str],
+    converter: Converter,
+    chunk_size: int,
+    in_flight: int,
+) -> Iterator[dict[str, Any]]:
+    """Yield the rows with the resolved values of `column` set as
+    `output_column`, in order."""
+    pending: collections.deque = collections.deque()
+
+    def finish() -> Iterator[dict[str, Any]]:
+        chunk, missing, future = pending.popleft()
+        found = converter.remember(missing, future.result())
+        for row in chunk:
+            value = _value(row, column)
+            result = None if value is None else converter.result(value, found)
+            row[output_column] = default if result is None else result
+            yield row
+
+    for chunk in chunked(rows, chunk_size):
+        values = [_value(row, column) for row in chunk]
+        values = [value for value in values if value is not None]
+        missing = converter.missing(values)
+        pending.append((chunk, missing, converter.submit(missing)))
+        # Keep the workers busy while bounding the rows held in memory.
+        if len(pending) >= in_flight:
+            yield from finish()
+    while pending:
+        yield from finish()
+
+
+def detect_format(filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".json":
+        raise InputError(
+            "JSON documents are not supported, only JSON lines "
+            "(use --format jsonl if the file has one object per line)"
+        )
+    return "jsonl" if ext in (".jsonl", ".ndjson") else "csv"
+
+
+def read_json_lines(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise InputError(f"Line {number}: invalid JSON") from None
+        if not isinstance(row, dict):
+            raise InputError(f"Line {number}: not a JSON object")
+        yield row
+
+
+def _open(filename: str, mode: str) -> ContextManager[IO[str]]:
+    if filename == "-":
+        return contextlib.nullcontext(sys.stdin if "r" in mode else sys.stdout)
+    return open(filename, mode, encoding="utf-8", newline="")
+
+
+def check_fields(args: argparse.Namespace) -> Optional[str]:
+    """Return an error message if the fields to match or output don't exist
+    in the database."""
+    db = getattr(pycountry, args.database)
+    # Going through the records also loads the indices.
+    if not any(args.to in record._fields for record in db):
+        return f"Field {args.to!r} not found in {args.database}"
+    field = args.field or args.to
+    if args.method == "get" and field not in db.indices:
+        return f"Field {field!r} is not indexed in {args.database}"
+    return None
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive integer")
+    return number
+
+
+def convert(args: argparse.Namespace) -> int:
+    error = check_fields(args)
+    if error is not None:
+        print(error, file=sys.stderr)
+        return 1
+
+    try:
+        fmt = args.format or detect_format(
+            args.output if args.input == "-" else args.input
+        )
+    except InputError as error:
+        print(error, file=sys.stderr)
+        return 1
+    output_column = args.output_column or args.column
+    resolver_args = (
+        args.database,
+        args.method,
+        args.field,
+        args.to,
+        args.max_distance,
+    )
+
+    start = time.perf_counter()
+    count = 0
+    with _open(args.input, "r") as infile, _open(args.output, "w") as outfile:
+        rows: Iterator[dict[str, Any]]
+        write: Callable[[dict[str, Any]], Any]
+        if fmt == "csv":
+            reader = csv.DictReader(infile)
+            fieldnames = list(reader.fieldnames or [])
+            if args.column not in fieldnames:
+                print(f"Column {args.column!r} not found", file=sys.stderr)
+                return 1
+            if output_column not in fieldnames:
+                fieldnames.append(output_column)
+            writer = csv.DictWriter(outfile, fieldnames)
+            writer.writeheader()
+            rows, write = reader, writer.writerow
+        else:
+            rows = read_json_lines(infile)
+
+            def write_line(row: dict[str, Any]) -> None:
+                outfile.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+            write = write_line
+
+        pool = None
+        if args.jobs > 1:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                args.jobs,
+                initializer=_init_worker,
+                initargs=resolver_args,
+            )
+        converter = Converter(make_resolver(*resolver_args), pool)
+        try:
+            for row in convert_rows(
+                rows,
+                args.column,
+                output_column,
+                args.default,
+                converter,
+                args.chunk_size,
+                max(1, 2 * args.jobs),
+            ):
+                write(row)
+                count += 1
+        except InputError as error:
+            print(error, file=sys.stderr)
+            return 1
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    lookups = converter.hits + converter.misses
+    print(
+        f"Converted {count} rows in {elapsed:.2f}s "
+        f"({count / elapsed if elapsed else 0:.0f} rows/s), "
+        f"{converter.misses} distinct values, "
+        f"{converter.hits / lookups if lookups else 0:.1%} memo hits",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pycountry")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_convert = commands.add_parser(
+        "convert",
+        help="resolve a column of a CSV or JSON lines file",
+        description="Stream a CSV or JSON lines file and resolve the values "
+        "of a column to an attribute of the matching records.",
+    )
+    parser_convert.add_argument("input", help="input file, - for stdin")
+    parser_convert.add_argument(
+        "-o", "--output", default="-", help="output file (default: stdout)"
+    )
+    parser_convert.add_argument(
+        "--format",
+        choices=["csv", "jsonl"],
+        help="file format (default: detected from the file extension)",
+    )
+    parser_convert.add_argument(
+        "-c", "--column", required=True, help="column to resolve"
+    )
+    parser_convert.add_argument(
+        "--output-column",
+        help="column to write the results to (default: the input column)",
+    )
+    parser_convert.add_argument(
+        "-d", "--database", choices=DATABASES, default="countries"
+    )
+    parser_convert.add_argument(
+        "-m",
+        "--method",
+        choices=["get", "lookup", "search_fuzzy"],
+        default="lookup",
+        help="how to find the records (default: %(default)s)",
+    )
+    parser_convert.add_argument(
+        "--field", help="field to match with --method get (default: --to)"
+    )
+    parser_convert.add_argument(
+        "--max-distance",
+        type=int,
+        choices=range(MAX_TYPO_DISTANCE + 1),
+        default=0,
+        help="typos tolerated with --method search_fuzzy (default: 0)",
+    )
+    parser_convert.add_argument(
+        "-t", "--to", required=True, help="attribute to output, e.g. alpha_2"
+    )
+    parser_convert.add_argument(
+        "--default",
+        default="",
+        help="output for values without a match (default: empty)",
+    )
+    parser_convert.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=1,
+        help="number of processes resolving values (default: %(default)s)",
+    )
+    parser_convert.add_argument(
+        "--chunk-size",
+        type=positive_int,
+        default=10000,
+        help="rows per chunk of work (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    return convert(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Dense tables for converting between the codes of database records."""
+
+from array import array
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Optional, TypeVar, Union
+
+# Numeric codes have three digits and index the tables directly.
+NUMERIC_SLOTS = 1000
+
+# Letter codes are packed into integers using 5 bits per letter.
+BITS_PER_LETTER = 5
+
+# Letter codes longer than this would need tables too large to be worth it.
+MAX_LETTERS = 3
+
+# Number of distinct codes remembered during a batch conversion.
+MEMO_SIZE = 1 << 16
+
+Code = Union[str, int]
+D = TypeVar("D")
+
+
+def pack_letters(code: str) -> Optional[int]:
+    """Pack a code of ASCII letters (case insensitive) into an integer, e.g.
+    for indexing a table. Return `None` for other codes."""
+    if not (code.isascii() and code.isalpha()):
+        return None
+    key = 0
+    for letter in code:
+        key = key << BITS_PER_LETTER | (ord(letter) & 0x1F)
+    return key
+
+
+def _is_number(code: str) -> bool:
+    return code.isascii() and code.isdigit()
+
+
+class CodeTable:
+    """Converts between the codes stored in the given fields of records.
+
+    Each field holds either numeric codes (e.g. "276"), which are accepted as
+    integers too, or letter codes of a fixed length (e.g. "DE" or "DEU"). The
+    code system of a given code is detected from its form. Fields with letter
+    codes of the same length (e.g. ISO 639-2/T and 639-2/B codes) are tried
+    in the given order.
+
+    Records lacking a code of a field can use the code of its `fallbacks`
+    field instead when converting to it.
+
+    """
+
+    def __init__(
+        self,
+        fields: Sequence[str],
+        records: Sequence[Mapping[str, Optional[str]]],
+        fallbacks: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self._values: dict[str, list[Optional[str]]] = {}
+        # Record numbers by packed or numeric code, -1 for unused slots
+        self._slots: dict[str, array] = {}
+        self._numeric_field: Optional[str] = None
+        self._letter_fields: dict[int, list[str]] = {}
+        typecode = "h" if len(records) < 1 << 15 else "i"
+
+        for field in fields:
+            values = [record.get(field) for record in records]
+            codes = [v for v in values if v is not None]
+            if not codes:
+                continue
+            if all(_is_number(code) for code in codes):
+                self._numeric_field = field
+                size = NUMERIC_SLOTS
+            else:
+                lengths = {len(code) for code in codes}
+                if len(lengths) != 1 or max(lengths) > MAX_LETTERS:
+                    raise ValueError(
+                        f"{field!r} codes must consist of up to "
+                        f"{MAX_LETTERS} letters and have the same length"
+                    )
+                length = lengths.pop()
+                self._letter_fields.setdefault(length, []).append(field)
+                size = 1 << (BITS_PER_LETTER * length)
+            self._values[field] = values
+            slots = self._slots[field] = array(typecode, [-1]) * size
+            for record_no, code in enumerate(values):
+                if code is None:
+                    continue
+                slot = self._slot(field, code)
+                if slot is None:
+                    raise ValueError(f"Invalid {field!r} code {code!r}")
+                # Later records win, as in the database's indices.
+                slots[slot] = record_no
+
+        for field, fallback in (fallbacks or {}).items():
+            if field in self._values and fallback in self._values:
+                self._values[field] = [
+                    value if value is not None else other
+                    for value, other in zip(
+                        self._values[field], self._values[fallback]
+                    )
+                ]
+
+    def _slot(self, field: str, code: Code) -> Optional[int]:
+        if field == self._numeric_field:
+            if isinstance(code, str):
+                code = int(code)
+            return code if 0 <= code < NUMERIC_SLOTS else None
+        assert isinstance(code, str)
+        return pack_letters(code)
+
+    def record_no(self, code: Code) -> Optional[int]:
+        """Return the number of the record with the given code of any code
+        system, in the order the records were given."""
+        if isinstance(code, bool) or not isinstance(code, (str, int)):
+            return None
+        if isinstance(code, int) or _is_number(code):
+            field = self._numeric_field
+            if field is None:
+                return None
+            fields = [field]
+            slot = self._slot(field, code)
+        else:
+            fields = self._letter_fields.get(len(code), [])
+            slot = pack_letters(code)
+        if slot is None:
+            return None
+        for field in fields:
+            record_no = self._slots[field][slot]
+            if record_no >= 0:
+                return record_no
+        return None
+
+    def _target(self, to: str) -> list[Optional[str]]:
+        try:
+            return self._values[to]
+        except KeyError:
+            raise ValueError(
+                f"Can not convert to {to!r}, choose one of "
+                f"{', '.join(self._values)}"
+            ) from None
+
+    def convert(
+        self, code: Code, to: str, default: Optional[D] = None
+    ) -> Union[str, D, None]:
+        """Convert a code of any code system to the code system of the field
+        `to`, or return `default` for unknown codes."""
+        values = self._target(to)
+        record_no = self.record_no(code)
+        if record_no is None:
+            return default
+        value = values[record_no]
+        return default if value is None else value
+
+    def convert_many(
+        self, codes: Iterable[Code], to: str, default: Optional[D] = None
+    ) -> list[Union[str, D, None]]:
+        """Convert many codes at once, see `convert`."""
+        values = self._target(to)
+        record_no = self.record_no
+        results: list[Union[str, D, None]] = []
+        append = results.append
+        # Columns tend to repeat the same codes: remember the conversions of
+        # (a bounded number of) distinct strings.
+        memo: dict[str, Union[str, D, None]] = {}
+        for code in codes:
+            if type(code) is str and code in memo:
+                append(memo[code])
+                continue
+            i = record_no(code)
+            value = None if i is None else values[i]
+            result = default if value is None else value
+            if type(code) is str and len(memo) < MEMO_SIZE:
+                memo[code] = result
+            append(result)
+        return results
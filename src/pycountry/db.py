@@ -1,11 +1,170 @@
+import gettext
 import json
 import logging
+import re
+import sys
 import threading
-from collections.abc import Iterator
-from typing import Any, Callable, Generic, Optional, TypeVar, Union, cast
+from collections import OrderedDict
+from collections.abc import Collection, Hashable, Iterable, Iterator
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Generic,
+    NamedTuple,
+    Optional,
+    TypeVar,
+    Union,
+    cast,
+)
+
+from pycountry.codes import Code, CodeTable
+from pycountry.search import (
+    SearchIndex,
+    Tier,
+    effective_distance,
+    normalize,
+    rank,
+)
 
 logger = logging.getLogger("pycountry.db")
 
+# Size of the chunks read from the database files while streaming them.
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"\s*")
+_SEPARATOR = re.compile(r"\s*([,\]])\s*")
+# What may follow the part of a number decoded from the end of a chunk
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
+
+
+class _JSONStream:
+    """Decode a JSON document value by value while reading it in chunks.
+
+    Only the tokens between values are scanned here; the values themselves
+    are decoded by the (C accelerated) standard decoder.
+
+    """
+
+    def __init__(self, f: IO[str]) -> None:
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        # Share the key strings between all decoded objects, as decoding the
+        # whole document at once would.
+        self.keys: dict[str, str] = {}
+        self.decoder = json.JSONDecoder(object_pairs_hook=self._make_object)
+
+    def _make_object(self, pairs: list[tuple[str, Any]]) -> dict[str, Any]:
+        keys = self.keys
+        return {keys.setdefault(key, key): value for key, value in pairs}
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            match = _WHITESPACE.match(self.buffer, self.pos)
+            assert match is not None
+            self.pos = match.end()
+            if self.pos < len(self.buffer) or not self._fill():
+                return
+
+    def accept(self, token: str) -> bool:
+        self._skip_whitespace()
+        if self.buffer.startswith(token, self.pos):
+            self.pos += len(token)
+            return True
+        return False
+
+    def expect(self, token: str) -> None:
+        if not self.accept(token):
+            raise json.JSONDecodeError(
+                f"Expecting {token!r}", self.buffer, self.pos
+            )
+
+    def _cut_off(self, value: Any, end: int) -> bool:
+        """Tell whether a value decoded up to `end` may continue in the next
+        chunk."""
+        if end == len(self.buffer):
+            return True
+        # Numbers are decoded up to the first character that can't continue
+        # them in place, e.g. "12345." at the end of a chunk as 12345.
+        return type(value) in (int, float) and bool(
+            _NUMBER_TAIL.match(self.buffer, end)
+        )
+
+    def value(self) -> Any:
+        if self.pos < len(self.buffer) and not self.buffer[self.pos].isspace():
+            # Fast path: the value starts within the current chunk.
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                pass
+            else:
+                if not self._cut_off(value, end):
+                    self.pos = end
+                    return value
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value may continue in the next chunk.
+                if self._fill():
+                    continue
+                raise
+            if self._cut_off(value, end) and self._fill():
+                # Numbers and literals may be cut off at the chunk boundary.
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator[Any]:
+        """Yield the values of the array starting at the current position."""
+        self.expect("[")
+        if self.accept("]"):
+            return
+        while True:
+            yield self.value()
+            # Fast path: the separator and the whitespace around it are
+            # within the current chunk.
+            match = _SEPARATOR.match(self.buffer, self.pos)
+            if match is not None and match.end() < len(self.buffer):
+                self.pos = match.end()
+                if match.group(1) == "]":
+                    return
+                continue
+            if self.accept("]"):
+                return
+            self.expect(",")
+
+
+def iter_entries(filename: str, root_key: Optional[str]) -> Iterator[Any]:
+    """Yield the entries of the `root_key` array of a JSON database file one
+    by one, without decoding the whole file at once."""
+    with open(filename, encoding="utf-8") as f:
+        stream = _JSONStream(f)
+        stream.expect("{")
+        if stream.accept("}"):
+            raise KeyError(root_key)
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key != root_key:
+                stream.value()
+            else:
+                yield from stream.array()
+                return
+            if stream.accept("}"):
+                raise KeyError(root_key)
+            stream.expect(",")
+
 
 class Data:
     def __init__(self, **fields: str):
@@ -34,6 +193,21 @@ class Data:
         for field in self._fields:
             yield field, getattr(self, field)
 
+    def to_dict(self) -> dict[str, Any]:
+        return dict(self)
+
+    def to_json_bytes(self) -> bytes:
+        """Return the fields encoded as JSON. Unlike
+        `Database.to_json_bytes`, this is neither cached nor translated."""
+        return encode_json(self.to_dict())
+
+
+def encode_json(value: Any) -> bytes:
+    """Encode a value as compact UTF-8 JSON."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
 
 class Country(Data):
     pass
@@ -43,6 +217,20 @@ class Subdivision(Data):
     pass
 
 
+def _attributes(obj: Data) -> Iterator[tuple[str, Any]]:
+    """Yield the fields of a record that are instance attributes as well.
+
+    Unlike `vars`, this doesn't create an instance dict where Python keeps
+    the attributes without one.
+
+    """
+    for key in obj._fields:
+        try:
+            yield key, object.__getattribute__(obj, key)
+        except AttributeError:
+            pass
+
+
 F = TypeVar("F", bound=Callable[..., Any])
 
 
@@ -56,6 +244,80 @@ def lazy_load(f: F) -> F:
     return cast(F, load_if_needed)
 
 
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class MemoryReport(NamedTuple):
+    """Estimated bytes taken by the records and indices of a database."""
+
+    before: int
+    after: int
+
+    @property
+    def saved(self) -> int:
+        return self.before - self.after
+
+
+class LRUCache:
+    """A bounded mapping that drops the least recently used entries.
+
+    The cached values belong to a version of the underlying data: looking up
+    or storing a value for a different version clears the cache.
+
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be positive, got {maxsize!r}")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._version: Hashable = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: Hashable) -> None:
+        if version != self._version:
+            self._data.clear()
+            self._version = version
+
+    def get(self, key: Hashable, version: Hashable) -> Any:
+        """Return the value cached for `key` or raise a `KeyError`."""
+        with self._lock:
+            self._check_version(version)
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, version: Hashable) -> None:
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._data)
+            )
+
+
 T = TypeVar("T", bound=Data)
 
 
@@ -63,11 +325,36 @@ class Database(Generic[T]):
     data_class: Union[type, str]
     root_key: Optional[str] = None
     no_index: list[str] = []
+    # Name fields considered by `search_fuzzy`, in priority order.
+    search_fields: list[str] = ["name"]
+    # Code fields supported by `convert`, and the fields whose codes to use
+    # when converting to a field a record has no code for.
+    code_fields: list[str] = []
+    code_fallbacks: dict[str, str] = {}
+    # Fields translated by `to_dict` and `to_json_bytes`
+    translated_fields: list[str] = ["name", "official_name", "common_name"]
+    # Number of encoded records and arrays cached by `to_json_bytes` and
+    # `dump_json_bytes`
+    json_cache_size: int = 8192
+    # Decode the file record by record when loading: this lowers the peak
+    # memory usage, but decoding takes two to three times as long.
+    stream_load: bool = False
 
     def __init__(self, filename: str) -> None:
         self.filename = filename
         self._is_loaded = False
         self._load_lock = threading.Lock()
+        # Incremented whenever the records change, to invalidate caches.
+        self._generation = 0
+        self._cache: Optional[LRUCache] = None
+        self._search_index: Optional[SearchIndex[T]] = None
+        self._columns: Optional[dict[str, tuple[Optional[str], ...]]] = None
+        self._arrow_table: Any = None
+        self._code_table: Optional[CodeTable] = None
+        # Encoded records and arrays of records by locale
+        self._json = LRUCache(self.json_cache_size)
+        self._translations: dict[str, gettext.NullTranslations] = {}
+        self._frozen = False
 
         if isinstance(self.data_class, str):
             self.factory = type(self.data_class, (Data,), {})
@@ -76,9 +363,45 @@ class Database(Generic[T]):
 
     def _clear(self):
         self._is_loaded = False
+        self._frozen = False
         self.objects = []
         self.index_names = set()
         self.indices = {}
+        self._changed()
+
+    def _changed(self) -> None:
+        """Drop everything derived from the records."""
+        self._search_index = None
+        self._columns = None
+        self._arrow_table = None
+        self._code_table = None
+        self._generation += 1
+
+    def _cache_version(self) -> Hashable:
+        """Return the version of all data the cached results depend on."""
+        return self._generation
+
+    def _cached(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the result of `compute` from the result cache, if enabled.
+
+        `LookupError`s are cached as well.
+
+        """
+        cache = self._cache
+        if cache is None:
+            return compute()
+        version = self._cache_version()
+        try:
+            result = cache.get(key, version)
+        except KeyError:
+            try:
+                result = compute()
+            except LookupError as e:
+                result = e
+            cache.put(key, result, version)
+        if isinstance(result, LookupError):
+            raise type(result)(*result.args)
+        return result
 
     def _load(self) -> None:
         if self._is_loaded:
@@ -87,11 +410,15 @@ class Database(Generic[T]):
             return
         self._clear()
 
-        with open(self.filename, encoding="utf-8") as f:
-            tree = json.load(f)
+        entries: Iterable[dict[str, str]]
+        if self.stream_load:
+            entries = self.iter_raw()
+        else:
+            with open(self.filename, encoding="utf-8") as f:
+                entries = json.load(f)[self.root_key]
 
-        for entry in tree[self.root_key]:
-            obj = self.factory(**entry)
+        for entry in entries:
+            obj = self._make_record(entry)
             self.objects.append(obj)
             # Inject into index.
             for key, value in entry.items():
@@ -111,10 +438,112 @@ class Database(Generic[T]):
 
         self._is_loaded = True
 
+    def _make_record(self, entry: dict[str, str]) -> T:
+        return self.factory(**entry)
+
     # Public API
 
+    def enable_cache(self, maxsize: int = 256) -> None:
+        """Cache the results of the last `maxsize` distinct `lookup` and
+        `search_fuzzy` queries.
+
+        The cache is keyed on the normalized queries and invalidated when
+        entries are added or removed.
+
+        """
+        self._cache = LRUCache(maxsize)
+
+    def disable_cache(self) -> None:
+        self._cache = None
+
+    def cache_info(self) -> Optional[CacheInfo]:
+        """Return the hit and miss statistics of the result cache, if
+        enabled."""
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def iter_raw(self) -> Iterator[dict[str, str]]:
+        """Stream the records of the database file as plain dicts.
+
+        This neither loads the database nor keeps the records around.
+
+        """
+        return iter_entries(self.filename, self.root_key)
+
+    def _check_writable(self) -> None:
+        if self._frozen:
+            raise TypeError(f"{type(self).__name__} is read-only")
+
+    @lazy_load
+    def memory_usage(self) -> int:
+        """Return an estimate of the bytes taken by the records and indices,
+        counting objects shared between them once."""
+        seen: set[int] = set()
+
+        def size(obj: Any) -> int:
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            return sys.getsizeof(obj)
+
+        total = size(self.objects)
+        for obj in self.objects:
+            total += size(obj) + size(obj._fields)
+            for key, value in obj._fields.items():
+                total += size(key) + size(value)
+            for _, value in _attributes(obj):
+                total += size(value)
+        for index in self.indices.values():
+            total += size(index)
+            for value, obj in index.items():
+                # Subdivisions are indexed by country in sets.
+                total += size(value) + size(obj)
+        return total
+
+    @lazy_load
+    def freeze(self) -> MemoryReport:
+        """Make the database read-only and share equal strings between all
+        records and indices.
+
+        Repeated values (e.g. the types of subdivisions) and index keys
+        equal to the values they were lowercased from are stored only once,
+        and field names are interned. A frozen database never changes, so
+        threads and forked processes can share it as it is.
+
+        """
+        before = self.memory_usage()
+        with self._load_lock:
+            strings: dict[str, str] = {}
+
+            def share(value: Any) -> Any:
+                if not isinstance(value, str):
+                    return value
+                return strings.setdefault(value, value)
+
+            for obj in self.objects:
+                obj._fields = {
+                    sys.intern(key): share(value)
+                    for key, value in obj._fields.items()
+                }
+                # Attributes set after creating the record (e.g. the
+                # country code of subdivisions) are kept in both places.
+                for key, value in _attributes(obj):
+                    if value == obj._fields[key]:
+                        object.__setattr__(obj, key, obj._fields[key])
+            self.indices = {
+                sys.intern(field): {
+                    share(value): obj for value, obj in index.items()
+                }
+                for field, index in self.indices.items()
+            }
+            self._frozen = True
+        return MemoryReport(before, self.memory_usage())
+
     @lazy_load
     def add_entry(self, **kw):
+        self._check_writable()
+
         # create the object with the correct dynamic type
         obj = self.factory(**kw)
 
@@ -129,8 +558,12 @@ class Database(Generic[T]):
             index = self.indices.setdefault(key, {})
             index[value] = obj
 
+        self._changed()
+
     @lazy_load
     def remove_entry(self, **kw):
+        self._check_writable()
+
         # make sure that we receive None if no entry found
         if "default" in kw:
             del kw["default"]
@@ -152,6 +585,8 @@ class Database(Generic[T]):
             if value in index:
                 del index[value]
 
+        self._changed()
+
     @lazy_load
     def __iter__(self) -> Iterator[T]:
         return iter(self.objects)
@@ -160,6 +595,10 @@ class Database(Generic[T]):
     def __len__(self) -> int:
         return len(self.objects)
 
+    @lazy_load
+    def _is_indexed(self, field: str) -> bool:
+        return field in self.indices
+
     @lazy_load
     def get(
         self, *, default: Optional[T] = None, **kw: Optional[str]
@@ -167,6 +606,8 @@ class Database(Generic[T]):
         if len(kw) != 1:
             raise TypeError("Only one criteria may be given")
         field, value = kw.popitem()
+        if field == "numeric" and type(value) is int:
+            value = "%03d" % value
         if not isinstance(value, str):
             raise LookupError()
         # Normalize for case-insensitivity
@@ -187,7 +628,9 @@ class Database(Generic[T]):
 
         # Normalize for case-insensitivity
         value = value.lower()
+        return self._cached(("lookup", value), lambda: self._lookup(value))
 
+    def _lookup(self, value: str) -> T:
         # Use indexes first
         for key in self.indices:
             try:
@@ -196,6 +639,15 @@ class Database(Generic[T]):
                 pass
 
         # Use non-indexed values now. Avoid going through indexed values.
+        candidate = self._unindexed_lookup(value)
+        if candidate is not None:
+            return candidate
+
+        raise LookupError("Could not find a record for %r" % value)
+
+    def _unindexed_lookup(self, value: str) -> Optional[T]:
+        """Return the first record with a `no_index` field equal to the
+        lowercase `value`."""
         for candidate in self:
             for k in self.no_index:
                 v = candidate._fields.get(k)
@@ -203,5 +655,299 @@ class Database(Generic[T]):
                     continue
                 if v.lower() == value:
                     return candidate
+        return None
 
-        raise LookupError("Could not find a record for %r" % value)
+    def _index_record(self, index: SearchIndex[T], obj: T) -> None:
+        index.add(obj, [obj._fields.get(field) for field in self.search_fields])
+
+    @lazy_load
+    def _get_search_index(self) -> SearchIndex[T]:
+        index = self._search_index
+        if index is None:
+            # Build the index on first use: only searches need it.
+            index = SearchIndex()
+            for obj in self.objects:
+                self._index_record(index, obj)
+            self._search_index = index
+        return index
+
+    def _get_search_index_of(
+        self, records: Optional[Collection[T]]
+    ) -> SearchIndex[T]:
+        """Return the search index, or an index of just `records` to score
+        only them."""
+        if records is None:
+            return self._get_search_index()
+        index: SearchIndex[T] = SearchIndex(scan=True)
+        for obj in records:
+            self._index_record(index, obj)
+        return index
+
+    def _exact_results(
+        self, query: str, records: Optional[Collection[T]] = None
+    ) -> Iterator[tuple[T, int]]:
+        """Score an exact match of a normalized query on codes and names,
+        optionally only among `records`."""
+        try:
+            record = self.lookup(query)
+        except LookupError:
+            return
+        if records is None or record in records:
+            yield record, 50
+
+    def _partial_results(
+        self, query: str, records: Optional[Collection[T]] = None
+    ) -> Iterator[tuple[T, int]]:
+        """Score partial matches of a normalized query on `search_fields`,
+        optionally only among `records`."""
+        for candidate, position in self._get_search_index_of(
+            records
+        ).partial_matches(query):
+            if position is None:
+                # Initials match
+                yield candidate, 40
+            else:
+                # This prefers records with a match early in their name and
+                # also balances against records with a number of partial
+                # matches and their name containing e.g. 'new' in the middle
+                yield candidate, max([5, 30 - (2 * position)])
+
+    def _typo_results(
+        self,
+        query: str,
+        max_distance: int,
+        records: Optional[Collection[T]] = None,
+    ) -> Iterator[tuple[T, int]]:
+        """Score typo-tolerant matches of a normalized query on
+        `search_fields`, optionally only among `records`."""
+        if not max_distance:
+            return
+        for distance, candidate in self._get_search_index_of(
+            records
+        ).typo_matches(query, max_distance):
+            # Exact matches (distance 0) are scored by the other tiers.
+            if distance:
+                yield candidate, max([1, 10 - 4 * distance])
+
+    def _fuzzy_tiers(self, query: str, max_distance: int) -> list[Tier[T]]:
+        """Return the tiers of a fuzzy search with the maximum points a
+        record can get from each, highest priority first."""
+        return [
+            # Prio 1: exact matches on codes and names
+            (50, lambda records: self._exact_results(query, records)),
+            # Prio 2: partial matches on names
+            (40, lambda records: self._partial_results(query, records)),
+            # Prio 3: typo-tolerant matches on names
+            (
+                6 if max_distance else 0,
+                lambda records: self._typo_results(
+                    query, max_distance, records
+                ),
+            ),
+        ]
+
+    def _fuzzy_sort_key(self, record: T) -> Any:
+        # Records with the same points are kept in database order to ensure
+        # stable results.
+        return self._get_search_index().order(record)
+
+    @lazy_load
+    def search_fuzzy_scored(
+        self, query: str, max_distance: int = 0, limit: Optional[int] = None
+    ) -> list[tuple[T, int]]:
+        """Return `(record, points)` pairs for the records matching `query`,
+        best first.
+
+        With a `limit`, only the best records are kept and lower priority
+        matches are not searched once they can't change the result anymore,
+        except for the points of the kept records.
+
+        """
+        query = normalize(query)
+        max_distance = effective_distance(query, max_distance)
+        results = self._cached(
+            ("search_fuzzy", query, max_distance, limit),
+            lambda: self._search_fuzzy_scored(query, max_distance, limit),
+        )
+        # Don't hand out the cached list itself.
+        return list(results)
+
+    def _search_fuzzy_scored(
+        self, query: str, max_distance: int, limit: Optional[int]
+    ) -> list[tuple[T, int]]:
+        results = rank(
+            self._fuzzy_tiers(query, max_distance),
+            self._fuzzy_sort_key,
+            limit,
+        )
+        if not results:
+            raise LookupError(query)
+        return results
+
+    def search_fuzzy(
+        self, query: str, max_distance: int = 0, limit: Optional[int] = None
+    ) -> list[T]:
+        return [
+            record
+            for record, _ in self.search_fuzzy_scored(
+                query, max_distance, limit
+            )
+        ]
+
+    @lazy_load
+    def to_columns(self) -> dict[str, tuple[Optional[str], ...]]:
+        """Return the records as columns in database order.
+
+        The result maps each field name to a tuple with the field's value for
+        every record, or `None` for records without that field.
+
+        """
+        columns = self._columns
+        if columns is None:
+            # Fields in order of their first appearance
+            fields: dict[str, None] = {}
+            for obj in self.objects:
+                fields.update(dict.fromkeys(obj._fields))
+            columns = {
+                field: tuple([obj._fields.get(field) for obj in self.objects])
+                for field in fields
+            }
+            self._columns = columns
+        return dict(columns)
+
+    def to_arrow(self) -> Any:
+        """Return the records as a `pyarrow.Table` (requires pyarrow)."""
+        try:
+            import pyarrow  # type: ignore
+        except ImportError as e:
+            raise ImportError("to_arrow() requires pyarrow") from e
+        table = self._arrow_table
+        if table is None:
+            table = pyarrow.table(
+                {
+                    field: pyarrow.array(values, type=pyarrow.string())
+                    for field, values in self.to_columns().items()
+                }
+            )
+            self._arrow_table = table
+        return table
+
+    def to_pandas(self) -> Any:
+        """Return the records as a new `pandas.DataFrame` (requires
+        pandas)."""
+        try:
+            import pandas  # type: ignore
+        except ImportError as e:
+            raise ImportError("to_pandas() requires pandas") from e
+        return pandas.DataFrame(self.to_columns())
+
+    def translation(self, locale: str) -> gettext.NullTranslations:
+        """Return the translations of the names in this database to a
+        locale, e.g. "de".
+
+        Raises a `LookupError` if there are none.
+
+        """
+        translation = self._translations.get(locale)
+        if translation is None:
+            from pycountry import LOCALES_DIR
+
+            try:
+                translation = gettext.translation(
+                    f"iso{self.root_key}", LOCALES_DIR, languages=[locale]
+                )
+            except OSError:
+                raise LookupError(f"No translations for {locale!r}")
+            self._translations[locale] = translation
+        return translation
+
+    def to_dict(
+        self, record: T, locale: Optional[str] = None
+    ) -> dict[str, Any]:
+        """Return the fields of a record, with its names translated to
+        `locale` if given."""
+        fields = record.to_dict()
+        if locale is not None:
+            translate = self.translation(locale).gettext
+            for field in self.translated_fields:
+                if isinstance(fields.get(field), str):
+                    fields[field] = translate(fields[field])
+        return fields
+
+    def to_json_bytes(self, record: T, locale: Optional[str] = None) -> bytes:
+        """Return a record encoded as JSON, like `to_dict`.
+
+        The last `json_cache_size` encoded records and arrays are cached
+        until entries are added or removed.
+
+        """
+        return self._cached_json(
+            (record, locale),
+            lambda: encode_json(self.to_dict(record, locale)),
+        )
+
+    def _cached_json(self, key: Hashable, encode: Callable[[], bytes]) -> bytes:
+        version = self._generation
+        try:
+            return self._json.get(key, version)
+        except KeyError:
+            data = encode()
+            self._json.put(key, data, version)
+            return data
+
+    @lazy_load
+    def dump_json_bytes(self, locale: Optional[str] = None, **kw: Any) -> bytes:
+        """Return a JSON array of all records, or of the records matching a
+        criterion of `get` (e.g. the subdivisions of a country), in database
+        order.
+
+        Raises a `LookupError` if no record matches. The arrays are cached
+        like the records of `to_json_bytes`.
+
+        """
+
+        def encode() -> bytes:
+            records: Iterable[T] = self.objects
+            if kw:
+                found = self.get(**kw)
+                if found is None:
+                    raise LookupError(f"Could not find a record for {kw!r}")
+                if isinstance(found, Data):
+                    records = [cast(T, found)]
+                else:
+                    records = [obj for obj in self.objects if obj in found]
+            return b"[%s]" % b",".join(
+                self.to_json_bytes(obj, locale) for obj in records
+            )
+
+        key = ("dump", locale, *[(f, str(v).lower()) for f, v in kw.items()])
+        return self._cached_json(key, encode)
+
+    @lazy_load
+    def _get_code_table(self) -> CodeTable:
+        table = self._code_table
+        if table is None:
+            table = CodeTable(
+                self.code_fields,
+                [obj._fields for obj in self.objects],
+                self.code_fallbacks,
+            )
+            self._code_table = table
+        return table
+
+    def convert(
+        self, code: Code, to: str, default: Optional[str] = None
+    ) -> Optional[str]:
+        """Convert a code of any of the `code_fields` (e.g. "DE", "DEU",
+        "276" or 276) to the code system given by `to` (e.g. "alpha_3").
+
+        Returns `default` for unknown codes.
+
+        """
+        return self._get_code_table().convert(code, to, default)
+
+    def convert_many(
+        self, codes: Iterable[Code], to: str, default: Optional[str] = None
+    ) -> list[Optional[str]]:
+        """Convert many codes at once, see `convert`."""
+        return self._get_code_table().convert_many(codes, to, default)
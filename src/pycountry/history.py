@@ -0,0 +1,122 @@
+"""Resolving withdrawn ISO 3166-3 country codes to current countries."""
+
+import re
+from collections.abc import Iterable
+from typing import NamedTuple, Optional
+
+from pycountry.db import Country
+
+# Two letter codes mentioned in comments like "divided into FM, MH, MP, and
+# PW".
+_CODE = re.compile(r"\b[A-Z]{2}\b")
+
+# ISO 3166-3 doesn't record the successors of countries that split up.
+# These are added to the ones told by the codes and comments.
+SPLITS = {
+    "ANHH": ("BQ", "CW", "SX"),
+    "CSHH": ("CZ", "SK"),
+    "CSXX": ("RS", "ME"),
+    "GEHH": ("KI", "TV"),
+    "NTHH": ("IQ", "SA"),
+    "SUHH": (
+        "AM",
+        "AZ",
+        "BY",
+        "EE",
+        "GE",
+        "KG",
+        "KZ",
+        "LT",
+        "LV",
+        "MD",
+        "RU",
+        "TJ",
+        "TM",
+        "UA",
+        "UZ",
+    ),
+    # Besides Serbia and Montenegro, succeeding it as "CS"
+    "YUCS": ("BA", "HR", "MK", "SI"),
+}
+
+
+class CodeResolution(NamedTuple):
+    # The current countries a code stands for: the country itself for
+    # current codes, the successors (if known) for withdrawn codes.
+    current: tuple[Country, ...]
+    # The withdrawn country, for withdrawn codes
+    historic: Optional[Country] = None
+
+
+def successors(
+    historic: Country,
+    current: dict[str, Country],
+    withdrawn: dict[str, list[Country]],
+) -> list[Country]:
+    """Return the current countries succeeding a withdrawn country, as far
+    as they can be told from its codes and comment.
+
+    `current` maps alpha-2 codes to the current countries, `withdrawn` maps
+    alpha-2 codes to withdrawn countries.
+
+    """
+    # The last two letters of an ISO 3166-3 code are the new alpha-2 code
+    # (e.g. "BUMM" for Burma, now Myanmar) or "HH" if there is no single
+    # successor.
+    new_code = historic.alpha_4[2:]
+    if new_code in current:
+        return [current[new_code]]
+    if new_code != "HH" and historic.alpha_2 in current:
+        # The country got new alpha-3 and alpha-4 codes only (e.g. "BYAA"
+        # for Belarus). Gilbert and Ellice Islands' "GE" is Georgia now,
+        # though.
+        return [current[historic.alpha_2]]
+
+    results = []
+    # The new code may be withdrawn itself (e.g. "YUCS" became Serbia and
+    # Montenegro, "CS"). Follow it to the country withdrawn later.
+    for successor in withdrawn.get(new_code, []):
+        if successor.withdrawal_date > historic.withdrawal_date:
+            results.extend(successors(successor, current, withdrawn))
+    codes = _CODE.findall(getattr(historic, "comment", ""))
+    for code in [*codes, *SPLITS.get(historic.alpha_4, ())]:
+        if code in current and current[code] not in results:
+            results.append(current[code])
+    return results
+
+
+def resolution_index(
+    countries: Iterable[Country], historic_countries: Iterable[Country]
+) -> dict[str, CodeResolution]:
+    """Map the lowercase codes of current and withdrawn countries to their
+    resolutions.
+
+    Current codes take precedence over withdrawn ones, and codes withdrawn
+    later over codes withdrawn earlier (e.g. "CS" for Serbia and Montenegro
+    rather than Czechoslovakia).
+
+    """
+    current = {country.alpha_2: country for country in countries}
+    withdrawn: dict[str, list[Country]] = {}
+    for historic in historic_countries:
+        withdrawn.setdefault(historic.alpha_2, []).append(historic)
+
+    index: dict[str, CodeResolution] = {}
+    code_fields = ("alpha_2", "alpha_3", "alpha_4", "numeric")
+    all_withdrawn = [h for records in withdrawn.values() for h in records]
+    all_withdrawn.sort(key=lambda h: h.withdrawal_date)
+    for historic in all_withdrawn:
+        resolution = CodeResolution(
+            tuple(successors(historic, current, withdrawn)), historic
+        )
+        for field in code_fields:
+            code = historic._fields.get(field)
+            if code is not None:
+                index[code.lower()] = resolution
+    for country in current.values():
+        resolution = CodeResolution((country,))
+        for field in code_fields:
+            code = country._fields.get(field)
+            if code is not None:
+                index[code.lower()] = resolution
+    return index
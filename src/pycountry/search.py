@@ -0,0 +1,411 @@
+"""Helpers for fuzzy and approximate (typo-tolerant) name searches."""
+
+import heapq
+import unicodedata
+from collections.abc import Hashable, Iterable, Iterator, Sequence
+from typing import Any, Callable, Generic, Optional, TypeVar, Union, cast
+
+# Upper bound for the edit distance accepted by typo-tolerant searches. Larger
+# distances make nearly every short name match and defeat the BK-tree's
+# pruning, so latency would no longer be bounded.
+MAX_TYPO_DISTANCE = 3
+
+
+def remove_accents(input_str: str) -> str:
+    output_str = input_str
+    if not input_str.isascii():
+        # Borrowed from https://stackoverflow.com/a/517974/1509718
+        nfkd_form = unicodedata.normalize("NFKD", input_str)
+        output_str = "".join(
+            [c for c in nfkd_form if not unicodedata.combining(c)]
+        )
+    return output_str
+
+
+def normalize(value: str) -> str:
+    """Normalize a name or query for case and accent insensitive matching."""
+    return remove_accents(value.strip().lower())
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Return the edit distance (insertions, deletions, substitutions)
+    between `a` and `b`.
+
+    Uses Myers' bit-parallel algorithm: the columns of the dynamic
+    programming matrix are encoded as bit vectors of `a`, so each character
+    of `b` costs a handful of integer operations instead of a full row.
+
+    """
+    if a == b:
+        return 0
+    if not a:
+        return len(b)
+    # Bit masks of the positions of each character in `a`.
+    positions: dict[str, int] = {}
+    bit = 1
+    for char in a:
+        positions[char] = positions.get(char, 0) | bit
+        bit <<= 1
+    last = 1 << (len(a) - 1)
+    vp = (1 << len(a)) - 1
+    vn = 0
+    distance = len(a)
+    for char in b:
+        x = positions.get(char, 0)
+        d0 = (((x & vp) + vp) ^ vp) | x | vn
+        hp = vn | ~(d0 | vp)
+        hn = d0 & vp
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        hp = (hp << 1) | 1
+        hn <<= 1
+        vp = hn | ~(d0 | hp)
+        vn = hp & d0
+    return distance
+
+
+def effective_distance(query: str, max_distance: int) -> int:
+    """Clamp the requested distance for a (normalized) query.
+
+    Short queries only tolerate few typos: allowing two edits on a three
+    letter query would match almost anything.
+
+    """
+    if not 0 <= max_distance <= MAX_TYPO_DISTANCE:
+        raise ValueError(
+            f"max_distance must be between 0 and {MAX_TYPO_DISTANCE}, "
+            f"got {max_distance!r}"
+        )
+    return min(max_distance, len(query) // 3)
+
+
+V = TypeVar("V")
+
+
+class BKTree(Generic[V]):
+    """A Burkhard-Keller tree over strings using the Levenshtein distance.
+
+    Each key can carry multiple values. Queries only visit the subtrees whose
+    distance to the current node is within the tolerated distance of the
+    query's distance to that node (triangle inequality).
+
+    """
+
+    def __init__(self) -> None:
+        # A node is [key, values, {distance: child node}]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: str, value: V) -> None:
+        if self._root is None:
+            self._root = [key, [value], {}]
+            self._size += 1
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(key, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            children = node[2]
+            if distance not in children:
+                children[distance] = [key, [value], {}]
+                self._size += 1
+                return
+            node = children[distance]
+
+    def search(self, key: str, max_distance: int) -> list[tuple[int, str, V]]:
+        """Return `(distance, key, value)` for all values whose key is at most
+        `max_distance` edits away from `key`, closest first."""
+        results: list[tuple[int, str, V]] = []
+        if self._root is None:
+            return results
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = levenshtein(key, node[0])
+            if distance <= max_distance:
+                results.extend((distance, node[0], v) for v in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in node[2].items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+        results.sort(key=lambda x: (x[0], x[1]))
+        return results
+
+
+def initials(value: str) -> str:
+    """Return the normalized initials of a name, e.g. "uk" for
+    "United Kingdom"."""
+    return normalize("".join([c for c in value if c.isupper()]))
+
+
+def trigrams(value: str) -> set[str]:
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+class SearchIndex(Generic[V]):
+    """Normalized names of database records, precomputed for searching.
+
+    Each record contributes its names in priority order (e.g. a country's
+    name before its official name). Substring searches only verify the names
+    sharing all trigrams of the query, and the BK-tree for typo-tolerant
+    searches is built on first use. With `scan`, searches check every name
+    instead, which is faster for indices of a few records searched once.
+
+    """
+
+    def __init__(self, scan: bool = False) -> None:
+        self._scan = scan
+        # One entry per name: (record number, rank, normalized name, initials)
+        self._entries: list[tuple[int, int, str, str]] = []
+        self._records: list[V] = []
+        self._record_nos: dict[int, int] = {}
+        self._initials: dict[str, list[int]] = {}
+        self._exact: dict[str, set[int]] = {}
+        self._group_sizes: dict[Hashable, int] = {}
+        self._trigrams: dict[str, set[int]] = {}
+        self._tree: Optional[BKTree[int]] = None
+
+    def add(
+        self,
+        record: V,
+        names: Sequence[Optional[str]],
+        aliases: Iterable[str] = (),
+        group: Optional[Hashable] = None,
+    ) -> None:
+        """Add a record's names in priority order.
+
+        `aliases` are only matched exactly by `exact_matches`. Records can be
+        assigned to a `group` (e.g. the country of a subdivision) to track
+        the size of the largest group.
+
+        """
+        record_no = len(self._records)
+        self._records.append(record)
+        self._record_nos[id(record)] = record_no
+        if group is not None:
+            self._group_sizes[group] = self._group_sizes.get(group, 0) + 1
+        for alias in aliases:
+            # Some names include alternative versions which we want to
+            # match exactly.
+            for alternative in remove_accents(alias.lower()).split(";"):
+                self._exact.setdefault(alternative, set()).add(record_no)
+        for rank, name in enumerate(names):
+            if name is None:
+                continue
+            entry_no = len(self._entries)
+            normalized = normalize(name)
+            name_initials = initials(name)
+            self._entries.append((record_no, rank, normalized, name_initials))
+            self._initials.setdefault(name_initials, []).append(entry_no)
+            if self._scan:
+                continue
+            for trigram in trigrams(normalized):
+                self._trigrams.setdefault(trigram, set()).add(entry_no)
+        self._tree = None
+
+    @property
+    def max_group_size(self) -> int:
+        return max(self._group_sizes.values(), default=0)
+
+    def names(self) -> Iterator[tuple[V, int, str, str]]:
+        """Yield `(record, rank, normalized name, initials)` for all names."""
+        for record_no, rank, name, name_initials in self._entries:
+            yield self._records[record_no], rank, name, name_initials
+
+    def aliases(self) -> Iterator[tuple[str, V]]:
+        """Yield `(normalized alias, record)` for all aliases."""
+        for alias, record_nos in self._exact.items():
+            for record_no in sorted(record_nos):
+                yield alias, self._records[record_no]
+
+    def order(self, record: V) -> int:
+        """Return the position of `record` in the order records were added."""
+        return self._record_nos[id(record)]
+
+    def _candidates(self, query: str) -> Sequence[int]:
+        """Return the numbers of the entries that may contain `query`."""
+        if self._scan or len(query) < 3:
+            return range(len(self._entries))
+        postings = []
+        for trigram in trigrams(query):
+            if trigram not in self._trigrams:
+                return []
+            postings.append(self._trigrams[trigram])
+        postings.sort(key=len)
+        return sorted(postings[0].intersection(*postings[1:]))
+
+    def exact_matches(self, query: str) -> list[V]:
+        """Return the records with an alias equal to the normalized `query`,
+        in the order the records were added."""
+        return [
+            self._records[record_no]
+            for record_no in sorted(self._exact.get(query, ()))
+        ]
+
+    def partial_matches(
+        self, query: str, match_initials: bool = True
+    ) -> list[tuple[V, Optional[int]]]:
+        """Return `(record, position)` for the records with a name containing
+        the normalized `query`, in the order the records were added.
+
+        With `match_initials`, a name whose initials equal the query matches
+        too and is reported with position `None`. Only the highest priority
+        matching name of each record is considered.
+
+        """
+        best: dict[int, tuple[int, Optional[int]]] = {}
+        entry_nos = set(self._candidates(query))
+        if match_initials:
+            entry_nos.update(self._initials.get(query, ()))
+        for entry_no in entry_nos:
+            record_no, rank, name, name_initials = self._entries[entry_no]
+            position: Optional[int]
+            if match_initials and name_initials == query:
+                position = None
+            else:
+                position = name.find(query)
+                if position == -1:
+                    continue
+            if record_no not in best or rank < best[record_no][0]:
+                best[record_no] = (rank, position)
+        return [
+            (self._records[record_no], best[record_no][1])
+            for record_no in sorted(best)
+        ]
+
+    def typo_matches(
+        self, query: str, max_distance: int
+    ) -> list[tuple[int, V]]:
+        """Return `(distance, record)` for the records with a name at most
+        `max_distance` edits away from the normalized `query`, closest
+        first."""
+        matches: list[tuple[int, str, int]] = []
+        if self._scan:
+            for entry_no, (_, _, name, _) in enumerate(self._entries):
+                for alternative in name.split(";"):
+                    alternative = alternative.strip()
+                    distance = levenshtein(query, alternative)
+                    if distance <= max_distance:
+                        matches.append((distance, alternative, entry_no))
+            matches.sort()
+        else:
+            tree = self._tree
+            if tree is None:
+                tree = BKTree()
+                for entry_no, (_, _, name, _) in enumerate(self._entries):
+                    # Some names include alternative versions separated by
+                    # semicolons.
+                    for alternative in name.split(";"):
+                        tree.add(alternative.strip(), entry_no)
+                self._tree = tree
+            matches = tree.search(query, max_distance)
+
+        results = []
+        seen = set()
+        for distance, _, entry_no in matches:
+            record_no = self._entries[entry_no][0]
+            if record_no in seen:
+                continue
+            seen.add(record_no)
+            results.append((distance, self._records[record_no]))
+        return results
+
+
+K = TypeVar("K", bound=Hashable)
+
+# A tier of fuzzy search results: the maximum number of points a single
+# candidate can get from the tier (or a function computing it, for bounds
+# depending on the query) and a function returning the tier's `(candidate,
+# points)` matches. Given a set of candidates, the function only needs to
+# return their matches.
+Tier = tuple[
+    Union[int, Callable[[], int]],
+    Callable[[Optional[set[K]]], Iterable[tuple[K, int]]],
+]
+
+
+def _gap(scores: dict[K, int], limit: int) -> int:
+    """Return the smallest difference in points between the best `limit`
+    candidates and their successors."""
+    best = heapq.nlargest(limit + 1, scores.values())
+    # Candidates without points so far may still catch up.
+    best.extend([0] * (limit + 1 - len(best)))
+    return min(best[i] - best[i + 1] for i in range(limit))
+
+
+def rank(
+    tiers: Sequence[Tier[K]],
+    sort_key: Callable[[K], Any],
+    limit: Optional[int] = None,
+) -> list[tuple[K, int]]:
+    """Sum the points of all tiers per candidate and return `(candidate,
+    points)` pairs, sorted by points first and `sort_key` second.
+
+    With a `limit`, only that many best candidates are kept and the remaining
+    tiers are skipped as soon as they cannot change the result anymore. They
+    are then only searched for the points of the kept candidates. Bounds
+    given as functions are only computed when needed for that.
+
+    """
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit must be positive, got {limit!r}")
+
+    bounds: list[Optional[int]] = [
+        bound if isinstance(bound, int) else None for bound, _ in tiers
+    ]
+
+    def settled(start: int) -> bool:
+        # The best candidates and their order are final when no candidate
+        # can make up the smallest gap with the remaining tiers. Sum the
+        # known bounds first to avoid computing the others.
+        assert limit is not None
+        gap = _gap(scores, limit)
+        remaining = 0
+        later = range(start, len(tiers))
+        for i in sorted(later, key=lambda i: bounds[i] is None):
+            bound = bounds[i]
+            if bound is None:
+                bound = bounds[i] = cast(Callable[[], int], tiers[i][0])()
+            remaining += bound
+            # Without any points left, even ties are final.
+            if remaining and remaining >= gap:
+                return False
+        return True
+
+    scores: dict[K, int] = {}
+    skipped: Sequence[Tier[K]] = []
+    for i, (_, matches) in enumerate(tiers):
+        if limit is not None and scores and settled(i):
+            skipped = tiers[i:]
+            break
+        for candidate, points in matches(None):
+            scores[candidate] = scores.get(candidate, 0) + points
+
+    # The negative value allows us to sort reversely on the points but
+    # ascending on the secondary key.
+    def key(item: tuple[K, int]) -> tuple[int, Any]:
+        return -item[1], sort_key(item[0])
+
+    if limit is None:
+        return sorted(scores.items(), key=key)
+    best = heapq.nsmallest(limit, scores.items(), key=key)
+    if skipped:
+        # The order is final, but the points must not depend on the limit.
+        kept = {candidate for candidate, _ in best}
+        extra: dict[K, int] = {}
+        for _, matches in skipped:
+            for candidate, points in matches(kept):
+                if candidate in kept:
+                    extra[candidate] = extra.get(candidate, 0) + points
+        best = [
+            (candidate, points + extra.get(candidate, 0))
+            for candidate, points in best
+        ]
+    return best
@@ -0,0 +1,487 @@
+"""A local HTTP server giving other processes and languages access to the
+databases:
+
+python -m pycountry.serve --port 8080
+
+All responses are JSON. The endpoints are, for each database (e.g.
+"countries"):
+
+GET /<database>/get?<field>=<value>
+    The record with a field's value, or the list of subdivisions with
+    `country_code=<value>`.
+GET /<database>/lookup?value=<value>
+    The record matching a value in any field.
+GET /<database>/search_fuzzy?query=<query>[&max_distance=1][&limit=10]
+    The list of records matching a query, best first.
+GET /<database>/translate?locale=<locale>&text=<text>
+    The translation of a name, e.g. `{"text": "Deutschland"}`.
+POST /<database>/batch
+    A JSON object with a `method` (one of the above), a list of `values`
+    and the other parameters of the method (e.g. `field` for "get"). The
+    results of all values are returned as `{"results": [...]}`, with
+    `null` for values without a match.
+
+GET /metrics
+    The number of requests and latencies per endpoint.
+
+Records nobody looks for return 404, invalid requests 400. Connections are
+kept alive until the client closes them or stays idle for too long. Requests
+are answered in a pool of threads, so slow ones don't hold up the others.
+
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import sys
+import threading
+import time
+from collections.abc import Iterable
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import pycountry
+from pycountry import DATABASES
+from pycountry.codes import MEMO_SIZE
+from pycountry.db import Data, Database
+from pycountry.search import MAX_TYPO_DISTANCE
+
+logger = logging.getLogger("pycountry.serve")
+
+METHODS = ["get", "lookup", "search_fuzzy", "translate"]
+
+# Requests larger than this are rejected.
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADERS = 100
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    414: "URI Too Long",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class EndpointMetrics:
+    """Request count and latencies of an endpoint. Percentiles are computed
+    over the most recent requests only."""
+
+    def __init__(self, window: int = 1024) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: collections.deque = collections.deque(maxlen=window)
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self) -> dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(p * len(recent)))]
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000 * percentile(0.5),
+            "p99_ms": 1000 * percentile(0.99),
+            "max_ms": 1000 * self.max,
+        }
+
+
+def _to_json(result: Any) -> Any:
+    if isinstance(result, Data):
+        return dict(result)
+    if isinstance(result, (set, frozenset)):
+        # Subdivisions of a country, in a stable order
+        return [dict(record) for record in sorted(result, key=_code)]
+    if isinstance(result, list):
+        return [_to_json(item) for item in result]
+    return result
+
+
+def _code(record: Data) -> str:
+    return record._fields.get("code") or ""
+
+
+def _int(params: dict[str, Any], name: str) -> Optional[int]:
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be an integer")
+    if value < 0:
+        raise HTTPError(400, f"{name} must not be negative")
+    return value
+
+
+class Server:
+    """Answers lookups on the databases over HTTP/1.1."""
+
+    def __init__(
+        self,
+        databases: Optional[dict[str, Database]] = None,
+        idle_timeout: float = 30.0,
+    ) -> None:
+        if databases is None:
+            databases = {name: getattr(pycountry, name) for name in DATABASES}
+        self.databases = databases
+        self.idle_timeout = idle_timeout
+        self.metrics: dict[str, EndpointMetrics] = {}
+        self._metrics_lock = threading.Lock()
+
+    def preload(self) -> None:
+        """Load the databases and their search indices up front, so the
+        first requests aren't slow."""
+        for name, db in self.databases.items():
+            start = time.perf_counter()
+            len(db)
+            db._get_search_index()
+            logger.info("Loaded %s in %.2fs", name, time.perf_counter() - start)
+
+    def _translation(self, db: Database, locale: Any) -> Callable[[str], str]:
+        if not isinstance(locale, str) or not locale:
+            raise HTTPError(400, "locale is required")
+        try:
+            return db.translation(locale).gettext
+        except LookupError as e:
+            raise HTTPError(404, str(e))
+
+    def _resolver(
+        self, db: Database, method: str, params: dict[str, Any]
+    ) -> Callable[[Any], Any]:
+        """Return a function returning the result of a method for a value,
+        or `None`."""
+        if method == "get":
+            field = params.get("field")
+            if not isinstance(field, str):
+                raise HTTPError(400, "field is required")
+            if not db._is_indexed(field):
+                raise HTTPError(400, f"Field {field!r} is not indexed")
+
+            def get(value: Any) -> Any:
+                try:
+                    return db.get(**{field: value})
+                except LookupError:
+                    return None
+
+            return get
+
+        if method == "lookup":
+
+            def lookup(value: Any) -> Any:
+                try:
+                    return db.lookup(value)
+                except LookupError:
+                    return None
+
+            return lookup
+
+        if method == "search_fuzzy":
+            max_distance = _int(params, "max_distance") or 0
+            if max_distance > MAX_TYPO_DISTANCE:
+                raise HTTPError(
+                    400, f"max_distance must be at most {MAX_TYPO_DISTANCE}"
+                )
+            limit = _int(params, "limit")
+            if limit == 0:
+                raise HTTPError(400, "limit must be positive")
+
+            def search_fuzzy(value: Any) -> Any:
+                if not isinstance(value, str):
+                    return []
+                try:
+                    return db.search_fuzzy(value, max_distance, limit)
+                except LookupError:
+                    return []
+
+            return search_fuzzy
+
+        if method == "translate":
+            translate = self._translation(db, params.get("locale"))
+            return lambda value: (
+                translate(value) if isinstance(value, str) else None
+            )
+
+        raise HTTPError(404, f"Unknown method {method!r}")
+
+    def _database(self, name: str) -> Database:
+        try:
+            return self.databases[name]
+        except KeyError:
+            raise HTTPError(404, f"Unknown database {name!r}")
+
+    def handle(self, method: str, target: str, body: bytes) -> tuple[int, Any]:
+        """Return the status and JSON result of a request."""
+        url = urlsplit(target)
+        params: dict[str, Any] = dict(parse_qsl(url.query))
+        path = url.path.strip("/").split("/")
+
+        if path == ["metrics"]:
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+            return 200, {
+                endpoint: metrics.summary()
+                for endpoint, metrics in sorted(self.metrics.items())
+            }
+        if len(path) != 2:
+            raise HTTPError(404, f"Unknown endpoint {url.path!r}")
+        db = self._database(path[0])
+
+        if path[1] == "batch":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            try:
+                params = json.loads(body)
+            except ValueError:
+                raise HTTPError(400, "Invalid JSON")
+            if not isinstance(params, dict) or not isinstance(
+                params.get("values"), list
+            ):
+                raise HTTPError(400, "values must be a list")
+            if params.get("method") not in METHODS:
+                raise HTTPError(400, "method must be one of %s" % METHODS)
+            return 200, {
+                "results": self._resolve_many(
+                    self._resolver(db, params["method"], params),
+                    params["values"],
+                )
+            }
+
+        if method != "GET":
+            raise HTTPError(405, "Use GET")
+        if path[1] == "get":
+            criteria = list(params.items())
+            if len(criteria) != 1:
+                raise HTTPError(400, "Only one criteria may be given")
+            params = {"field": criteria[0][0]}
+            value = criteria[0][1]
+        elif path[1] == "search_fuzzy":
+            value = params.get("query")
+        else:
+            value = params.get("text" if path[1] == "translate" else "value")
+        if value is None:
+            raise HTTPError(400, "No value given")
+        result = self._resolver(db, path[1], params)(value)
+        if result is None:
+            raise HTTPError(404, f"Could not find {value!r}")
+        if path[1] == "translate":
+            result = {"text": result}
+        return 200, _to_json(result)
+
+    def _resolve_many(
+        self, resolve: Callable[[Any], Any], values: Iterable[Any]
+    ) -> list[Any]:
+        results = []
+        # Batches repeat values a lot: resolve each of a (bounded) number of
+        # distinct values only once.
+        memo: dict[Any, Any] = {}
+        for value in values:
+            try:
+                results.append(memo[value])
+                continue
+            except (KeyError, TypeError):
+                pass
+            result = _to_json(resolve(value))
+            if isinstance(value, str) and len(memo) < MEMO_SIZE:
+                memo[value] = result
+            results.append(result)
+        return results
+
+    def _endpoint(self, target: str) -> str:
+        """Return the name metrics are recorded under."""
+        path = urlsplit(target).path.strip("/").split("/")
+        if path == ["metrics"] or (
+            len(path) == 2
+            and path[0] in self.databases
+            and path[1] in METHODS + ["batch"]
+        ):
+            return "/" + "/".join(path)
+        # Don't let invalid requests create arbitrary many metrics.
+        return "other"
+
+    def respond(
+        self, method: str, target: str, body: bytes
+    ) -> tuple[int, bytes]:
+        """Return the status and encoded body of a request, recording the
+        time it took."""
+        start = time.perf_counter()
+        try:
+            status, result = self.handle(method, target, body)
+        except HTTPError as e:
+            status, result = e.status, {"error": str(e)}
+        except Exception:
+            logger.exception("Error handling %s %s", method, target)
+            status, result = 500, {"error": "Internal server error"}
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        endpoint = self._endpoint(target)
+        with self._metrics_lock:
+            if endpoint not in self.metrics:
+                self.metrics[endpoint] = EndpointMetrics()
+            self.metrics[endpoint].record(
+                time.perf_counter() - start, status >= 400
+            )
+        return status, data
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[tuple[str, str, str, dict[str, str], bytes]]:
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        except ValueError:
+            # Longer than the stream's limit (64 KiB)
+            raise HTTPError(414, "Request line too long")
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Invalid request line")
+        headers: dict[str, str] = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HTTPError(400, "Header line too long")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "Request too large")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method, target, version, headers, body
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    error = json.dumps({"error": str(e)}).encode()
+                    self._write(writer, e.status, error, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                connection = headers.get("connection", "").lower()
+                if version == "HTTP/1.0":
+                    keep_alive = connection == "keep-alive"
+                else:
+                    keep_alive = connection != "close"
+                # Answer in a thread: a large batch or search must not hold
+                # up the other connections.
+                status, data = await asyncio.get_running_loop().run_in_executor(
+                    None, self.respond, method, target, body
+                )
+                self._write(writer, status, data, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            ConnectionError,
+        ):
+            pass
+        finally:
+            writer.close()
+
+    def _write(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        data: bytes,
+        keep_alive: bool,
+    ) -> None:
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 8080
+    ) -> asyncio.Server:
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(host: str, port: int, preload: bool = True) -> None:
+    server = Server()
+    if preload:
+        server.preload()
+    listener = await server.start(host, port)
+    for sock in listener.sockets:
+        logger.info("Listening on %s", sock.getsockname())
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pycountry.serve",
+        description="Serve lookups on the databases over HTTP.",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address to listen on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=8080,
+        help="port to listen on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-preload",
+        dest="preload",
+        action="store_false",
+        help="load the databases on the first requests instead of up front",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.preload))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""An SQLite backend keeping the records of databases on disk.
+
+The SQLite file is generated along with the JSON databases (see `build`).
+`sqlite_database` returns a database with the same API as a given one,
+serving its records, lookups and searches from indexed queries instead of
+keeping them in memory. Fuzzy searches use the FTS5 extension of SQLite.
+
+"""
+
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import weakref
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from typing import Any, Optional, TypeVar, Union
+
+import pycountry
+from pycountry.db import Data, Database, MemoryReport
+from pycountry.search import levenshtein, trigrams
+
+SQLITE_FILENAME = os.path.join(pycountry.DATABASE_DIR, "pycountry.sqlite")
+
+SCHEMA = """
+CREATE TABLE meta (
+    db TEXT, key TEXT, value INTEGER, PRIMARY KEY (db, key)
+) WITHOUT ROWID;
+CREATE TABLE records (
+    db TEXT, record_no INTEGER, data TEXT, PRIMARY KEY (db, record_no)
+) WITHOUT ROWID;
+CREATE TABLE fields (
+    db TEXT, position INTEGER, field TEXT, grouped INTEGER,
+    PRIMARY KEY (db, position)
+) WITHOUT ROWID;
+CREATE TABLE codes (
+    db TEXT, field TEXT, value TEXT, record_no INTEGER,
+    PRIMARY KEY (db, field, value, record_no)
+) WITHOUT ROWID;
+CREATE TABLE unindexed (
+    db TEXT, value TEXT, record_no INTEGER,
+    PRIMARY KEY (db, value, record_no)
+) WITHOUT ROWID;
+CREATE TABLE aliases (
+    db TEXT, alias TEXT, record_no INTEGER,
+    PRIMARY KEY (db, alias, record_no)
+) WITHOUT ROWID;
+CREATE TABLE names (
+    id INTEGER PRIMARY KEY, db TEXT, record_no INTEGER, rank INTEGER,
+    name TEXT, initials TEXT
+);
+CREATE INDEX names_initials ON names (db, initials);
+CREATE VIRTUAL TABLE names_fts USING fts5(
+    name, content='names', content_rowid='id', tokenize='trigram'
+);
+"""
+
+D = TypeVar("D", bound=Database)
+
+
+def build(
+    filename: str, databases: Optional[Iterable[Database]] = None
+) -> None:
+    """Write the records, indices and search names of `databases` (all of
+    pycountry's by default) to a new SQLite file."""
+    if databases is None:
+        databases = [
+            pycountry.countries,
+            pycountry.subdivisions,
+            pycountry.historic_countries,
+            pycountry.currencies,
+            pycountry.languages,
+            pycountry.language_families,
+            pycountry.scripts,
+        ]
+    tmp_filename = filename + ".tmp"
+    if os.path.exists(tmp_filename):
+        os.unlink(tmp_filename)
+    conn = sqlite3.connect(tmp_filename)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+            for db in databases:
+                _insert(conn, db)
+            conn.execute("INSERT INTO names_fts(names_fts) VALUES ('rebuild')")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_filename, filename)
+
+
+def _insert(conn: sqlite3.Connection, db: Database) -> None:
+    key = db.root_key
+    objects = list(db)
+    # The records are stored as given in the database file: records built
+    # from them may carry derived fields.
+    entries = list(db.iter_raw())
+    if len(entries) != len(objects):
+        raise ValueError(f"{key} has records not in {db.filename}")
+    record_nos = {id(obj): i for i, obj in enumerate(objects)}
+    conn.executemany(
+        "INSERT INTO records VALUES (?, ?, ?)",
+        [
+            (key, i, json.dumps(entry, ensure_ascii=False))
+            for i, entry in enumerate(entries)
+        ],
+    )
+
+    for position, (field, index) in enumerate(db.indices.items()):
+        grouped = any(isinstance(v, set) for v in index.values())
+        conn.execute(
+            "INSERT INTO fields VALUES (?, ?, ?, ?)",
+            (key, position, field, grouped),
+        )
+        conn.executemany(
+            "INSERT INTO codes VALUES (?, ?, ?, ?)",
+            [
+                (key, field, value, record_nos[id(obj)])
+                for value, target in index.items()
+                for obj in (target if isinstance(target, set) else [target])
+            ],
+        )
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO unindexed VALUES (?, ?, ?)",
+        [
+            (key, value.lower(), record_nos[id(obj)])
+            for obj in objects
+            for field, value in obj._fields.items()
+            if field in db.no_index and value is not None
+        ],
+    )
+
+    search_index = db._get_search_index()
+    conn.execute(
+        "INSERT INTO meta VALUES (?, 'max_group_size', ?)",
+        (key, search_index.max_group_size),
+    )
+    conn.executemany(
+        "INSERT INTO aliases VALUES (?, ?, ?)",
+        {
+            (key, alias, record_nos[id(obj)])
+            for alias, obj in search_index.aliases()
+        },
+    )
+    conn.executemany(
+        "INSERT INTO names (db, record_no, rank, name, initials) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [
+            (key, record_nos[id(obj)], rank, name, name_initials)
+            for obj, rank, name, name_initials in search_index.names()
+        ],
+    )
+
+
+def _phrase(value: str) -> str:
+    """Quote a value as an FTS5 phrase."""
+    return '"%s"' % value.replace('"', '""')
+
+
+class _Records(Sequence):
+    """The records of a database in database order."""
+
+    def __init__(self, backend: "SQLiteBackend") -> None:
+        self._backend = backend
+        # The databases are read-only.
+        self._len: Optional[int] = None
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = self._backend._query(
+                "SELECT count(*) FROM records WHERE db = :db"
+            )[0][0]
+        return self._len
+
+    def __getitem__(self, i: Any) -> Any:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._backend._record(i)
+
+    def __iter__(self) -> Iterator[Data]:
+        backend = self._backend
+        for record_no, data in backend._connection().execute(
+            "SELECT record_no, data FROM records WHERE db = ? "
+            "ORDER BY record_no",
+            (backend.root_key,),
+        ):
+            yield backend._record(record_no, data)
+
+
+class _Index(Mapping):
+    """The records of a database by the lowercase values of a field."""
+
+    def __init__(
+        self, backend: "SQLiteBackend", field: str, grouped: bool
+    ) -> None:
+        self._backend = backend
+        self._field = field
+        self._grouped = grouped
+
+    def __getitem__(self, value: str) -> Union[Data, set[Data]]:
+        rows = self._backend._query(
+            "SELECT record_no FROM codes "
+            "WHERE db = :db AND field = :field AND value = :value",
+            field=self._field,
+            value=value,
+        )
+        if not rows:
+            raise KeyError(value)
+        if self._grouped:
+            return {self._backend._record(row[0]) for row in rows}
+        return self._backend._record(rows[0][0])
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._backend._query(
+            "SELECT DISTINCT value FROM codes "
+            "WHERE db = :db AND field = :field ORDER BY value",
+            field=self._field,
+        )
+        return (row[0] for row in rows)
+
+    def __len__(self) -> int:
+        return self._backend._query(
+            "SELECT count(DISTINCT value) FROM codes "
+            "WHERE db = :db AND field = :field",
+            field=self._field,
+        )[0][0]
+
+
+class _SearchIndex:
+    """Answers the queries of a `pycountry.search.SearchIndex` from the
+    names stored in SQLite."""
+
+    def __init__(self, backend: "SQLiteBackend") -> None:
+        self._backend = backend
+
+    @property
+    def max_group_size(self) -> int:
+        rows = self._backend._query(
+            "SELECT value FROM meta WHERE db = :db AND key = 'max_group_size'"
+        )
+        return rows[0][0] if rows else 0
+
+    def order(self, record: Data) -> int:
+        return self._backend._record_nos[record]
+
+    def exact_matches(self, query: str) -> list[Data]:
+        rows = self._backend._query(
+            "SELECT DISTINCT record_no FROM aliases "
+            "WHERE db = :db AND alias = :query ORDER BY record_no",
+            query=query,
+        )
+        return [self._backend._record(row[0]) for row in rows]
+
+    def partial_matches(
+        self, query: str, match_initials: bool = True
+    ) -> list[tuple[Data, Optional[int]]]:
+        columns = "n.record_no, n.rank, instr(n.name, :query) - 1, n.initials"
+        if len(query) >= 3:
+            rows = self._backend._query(
+                f"SELECT {columns} FROM names n WHERE n.db = :db AND n.id IN "
+                "(SELECT rowid FROM names_fts WHERE names_fts MATCH :phrase)",
+                query=query,
+                phrase=_phrase(query),
+            )
+        else:
+            rows = self._backend._query(
+                f"SELECT {columns} FROM names n "
+                "WHERE n.db = :db AND instr(n.name, :query)",
+                query=query,
+            )
+        if match_initials:
+            rows += self._backend._query(
+                f"SELECT {columns} FROM names n "
+                "WHERE n.db = :db AND n.initials = :query",
+                query=query,
+            )
+
+        best: dict[int, tuple[int, Optional[int]]] = {}
+        for record_no, rank, position, name_initials in rows:
+            if match_initials and name_initials == query:
+                position = None
+            elif position == -1:
+                continue
+            if record_no not in best or rank < best[record_no][0]:
+                best[record_no] = (rank, position)
+        return [
+            (self._backend._record(record_no), best[record_no][1])
+            for record_no in sorted(best)
+        ]
+
+    def typo_matches(
+        self, query: str, max_distance: int
+    ) -> list[tuple[int, Data]]:
+        # Each edit changes at most three of the query's trigrams: names
+        # within the distance share at least one trigram with long enough
+        # queries. Shorter queries need to check all names.
+        if len(query) - 2 - 3 * max_distance >= 1:
+            rows = self._backend._query(
+                "SELECT id, record_no, name FROM names WHERE db = :db AND id IN "
+                "(SELECT rowid FROM names_fts WHERE names_fts MATCH :phrases)",
+                phrases=" OR ".join(map(_phrase, sorted(trigrams(query)))),
+            )
+        else:
+            rows = self._backend._query(
+                "SELECT id, record_no, name FROM names WHERE db = :db"
+            )
+
+        matches = []
+        for entry_id, record_no, name in rows:
+            # Some names include alternative versions separated by
+            # semicolons.
+            for alternative in name.split(";"):
+                alternative = alternative.strip()
+                distance = levenshtein(query, alternative)
+                if distance <= max_distance:
+                    matches.append((distance, alternative, entry_id, record_no))
+        matches.sort()
+
+        results = []
+        seen = set()
+        for distance, _, _, record_no in matches:
+            if record_no in seen:
+                continue
+            seen.add(record_no)
+            results.append((distance, self._backend._record(record_no)))
+        return results
+
+
+class SQLiteBackend(Database):
+    """Serves the records of a database from an SQLite file built by
+    `build`. Mixed into database classes by `sqlite_database`.
+
+    Each thread uses its own connection. Records are created on access and
+    shared for as long as they are in use. The databases are read-only.
+
+    """
+
+    def __init__(self, filename: str, sqlite_filename: str) -> None:
+        self.sqlite_filename = sqlite_filename
+        self._local = threading.local()
+        self._records_lock = threading.Lock()
+        self._records: weakref.WeakValueDictionary[int, Data] = (
+            weakref.WeakValueDictionary()
+        )
+        self._record_nos: weakref.WeakKeyDictionary[Data, int] = (
+            weakref.WeakKeyDictionary()
+        )
+        super().__init__(filename)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            uri = pathlib.Path(self.sqlite_filename).absolute().as_uri()
+            conn = sqlite3.connect(uri + "?mode=ro", uri=True)
+            self._local.connection = conn
+        return conn
+
+    def _query(self, sql: str, **params: Any) -> list[Any]:
+        params["db"] = self.root_key
+        return self._connection().execute(sql, params).fetchall()
+
+    def _record(self, record_no: int, data: Optional[str] = None) -> Any:
+        obj = self._records.get(record_no)
+        if obj is not None:
+            return obj
+        if data is None:
+            data = self._query(
+                "SELECT data FROM records "
+                "WHERE db = :db AND record_no = :record_no",
+                record_no=record_no,
+            )[0][0]
+        obj = self.factory(**json.loads(data))
+        with self._records_lock:
+            # Another thread may have been faster.
+            obj = self._records.setdefault(record_no, obj)
+            self._record_nos[obj] = record_no
+        return obj
+
+    def _load(self) -> None:
+        if self._is_loaded:
+            return
+        self._clear()
+        self.objects = _Records(self)
+        for field, grouped in self._query(
+            "SELECT field, grouped FROM fields WHERE db = :db ORDER BY position"
+        ):
+            self.indices[field] = _Index(self, field, bool(grouped))
+        self._is_loaded = True
+
+    def _unindexed_lookup(self, value: str) -> Any:
+        rows = self._query(
+            "SELECT min(record_no) FROM unindexed "
+            "WHERE db = :db AND value = :value",
+            value=value,
+        )
+        return None if rows[0][0] is None else self._record(rows[0][0])
+
+    def _get_search_index(self) -> Any:
+        return _SearchIndex(self)
+
+    def _get_shard(self, country_code: str) -> None:
+        # Subdivisions are looked up by country using the index, too.
+        return None
+
+    def iter_raw(self) -> Iterator[dict[str, str]]:
+        for (data,) in self._query(
+            "SELECT data FROM records WHERE db = :db ORDER BY record_no"
+        ):
+            yield json.loads(data)
+
+    def add_entry(self, **kw):
+        raise TypeError(f"{type(self).__name__} is read-only")
+
+    def remove_entry(self, **kw):
+        raise TypeError(f"{type(self).__name__} is read-only")
+
+    def memory_usage(self) -> int:
+        # The records and indices are kept in the file.
+        return 0
+
+    def freeze(self) -> MemoryReport:
+        # Read-only already
+        return MemoryReport(0, 0)
+
+
+def sqlite_database(db: D, filename: str = SQLITE_FILENAME) -> D:
+    """Return a database with the API of `db`, backed by an SQLite file.
+
+    For example, to use it for all country lookups::
+
+        pycountry.countries = sqlite_database(pycountry.countries)
+
+    """
+    cls = type(db)
+    backend = type(f"SQLite{cls.__name__}", (SQLiteBackend, cls), {})
+    return backend(db.filename, filename)
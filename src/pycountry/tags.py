@@ -0,0 +1,156 @@
+"""Resolving BCP 47 language tags and POSIX locale names to records."""
+
+import re
+from collections.abc import Hashable, Iterable
+from typing import Any, NamedTuple, Optional, TypeVar, Union
+
+from pycountry.codes import MEMO_SIZE
+from pycountry.db import CacheInfo, Data, Database, LRUCache
+
+_SEPARATOR = re.compile(r"[-_]")
+
+D = TypeVar("D")
+
+
+class LanguageTag(NamedTuple):
+    language: Data
+    script: Optional[Data] = None
+    country: Optional[Data] = None
+    subdivision: Optional[Data] = None
+
+
+def _is_letters(subtag: str, *lengths: int) -> bool:
+    return len(subtag) in lengths and subtag.isascii() and subtag.isalpha()
+
+
+class LanguageTags:
+    """Resolves tags like "pt-BR", "zh-Hant-TW" or "sr_Latn_RS" to their
+    language, script, country and subdivision records.
+
+    Besides BCP 47 tags, POSIX locale names (e.g. "de_DE.UTF-8") are
+    accepted. Subdivisions are given by the "sd" Unicode locale extension
+    (e.g. "en-GB-u-sd-gbsct"). Variants and other extensions are ignored.
+
+    The results of the last `maxsize` distinct tags are cached.
+
+    """
+
+    def __init__(
+        self,
+        languages: Database,
+        scripts: Database,
+        countries: Database,
+        subdivisions: Database,
+        maxsize: int = 1024,
+    ) -> None:
+        self.languages = languages
+        self.scripts = scripts
+        self.countries = countries
+        self.subdivisions = subdivisions
+        self._cache = LRUCache(maxsize)
+
+    def _cache_version(self) -> Hashable:
+        return tuple(
+            db._generation
+            for db in (
+                self.languages,
+                self.scripts,
+                self.countries,
+                self.subdivisions,
+            )
+        )
+
+    def cache_info(self) -> CacheInfo:
+        return self._cache.info()
+
+    def _parse(self, tag: str) -> LanguageTag:
+        # Drop the encoding and modifier of POSIX locale names.
+        subtags = _SEPARATOR.split(re.split("[.@]", tag, maxsplit=1)[0])
+
+        code = subtags.pop(0)
+        if not _is_letters(code, 2, 3):
+            raise LookupError("Invalid language tag %r" % tag)
+        if subtags and _is_letters(subtags[0], 3):
+            # An extended language subtag (e.g. "zh-yue") stands for the
+            # language itself.
+            code = subtags.pop(0)
+        alpha_3 = self.languages.convert(code, "alpha_3")
+        if alpha_3 is None:
+            raise LookupError("Unknown language in %r" % tag)
+        language = self.languages.get(alpha_3=alpha_3)
+        assert language is not None
+
+        script = None
+        if subtags and _is_letters(subtags[0], 4):
+            script = self.scripts.get(alpha_4=subtags.pop(0))
+
+        country = None
+        if subtags and (
+            _is_letters(subtags[0], 2)
+            or (len(subtags[0]) == 3 and subtags[0].isdigit())
+        ):
+            region = subtags.pop(0)
+            # Numeric (UN M.49) regions other than countries resolve to None.
+            if region.isdigit():
+                country = self.countries.get(numeric=region)
+            else:
+                country = self.countries.get(alpha_2=region)
+
+        subdivision = None
+        if "u" in subtags:
+            extension = subtags[subtags.index("u") + 1 :]
+            if "sd" in extension[:-1]:
+                value = extension[extension.index("sd") + 1]
+                code = f"{value[:2]}-{value[2:]}"
+                subdivision = self.subdivisions.get(code=code)
+        return LanguageTag(language, script, country, subdivision)
+
+    def resolve(self, tag: str) -> LanguageTag:
+        """Return the records a tag refers to.
+
+        Raises a `LookupError` if the tag's language is unknown. Unknown
+        scripts, regions and subdivisions are `None`.
+
+        """
+        if not isinstance(tag, str):
+            raise LookupError()
+        key = _SEPARATOR.sub("-", tag.strip().lower())
+        version = self._cache_version()
+        result: Any
+        try:
+            result = self._cache.get(key, version)
+        except KeyError:
+            try:
+                result = self._parse(key)
+            except LookupError as e:
+                result = e
+            self._cache.put(key, result, version)
+        if isinstance(result, LookupError):
+            raise type(result)(*result.args)
+        return result
+
+    def resolve_many(
+        self, tags: Iterable[str], default: Optional[D] = None
+    ) -> list[Union[LanguageTag, D, None]]:
+        """Resolve many tags at once, returning `default` for the tags that
+        can't be resolved."""
+        results: list[Union[LanguageTag, D, None]] = []
+        append = results.append
+        # Tags repeat a lot: resolve each of a (bounded) number of distinct
+        # tags only once.
+        memo: dict[str, Union[LanguageTag, D, None]] = {}
+        for tag in tags:
+            try:
+                append(memo[tag])
+                continue
+            except (KeyError, TypeError):
+                pass
+            result: Union[LanguageTag, D, None]
+            try:
+                result = self.resolve(tag)
+            except LookupError:
+                result = default
+            if isinstance(tag, str) and len(memo) < MEMO_SIZE:
+                memo[tag] = result
+            append(result)
+        return results
@@ -1,13 +1,23 @@
+import asyncio
 import gettext
+import io
+import itertools
+import json
 import os.path
 import re
+import sys
+import time
 from importlib import metadata as _importlib_metadata
 from unittest.mock import patch
 
 import pytest
 
 import pycountry
+import pycountry.__main__
+import pycountry.codes
 import pycountry.db
+import pycountry.search
+import pycountry.serve
 
 
 @pytest.fixture
@@ -472,3 +482,1265 @@ def test_subdivisions_with_missing_parents():
         if i.parent_code and not i.parent
     ]
     assert result == []
+
+
+def test_country_fuzzy_search_typos(countries):
+    with pytest.raises(LookupError):
+        pycountry.countries.search_fuzzy("Germny")
+
+    results = pycountry.countries.search_fuzzy("Germny", max_distance=1)
+    assert results[0] == pycountry.countries.get(alpha_2="DE")
+
+    # A swap of two letters counts as two edits.
+    results = pycountry.countries.search_fuzzy("Frnace", max_distance=2)
+    assert results[0] == pycountry.countries.get(alpha_2="FR")
+
+    # Typo matches rank below exact and partial matches.
+    results = pycountry.countries.search_fuzzy("England", max_distance=2)
+    assert results[0] == pycountry.countries.get(alpha_2="GB")
+
+    # Very short queries do not tolerate typos at all.
+    assert pycountry.countries.search_fuzzy(
+        "UK", max_distance=2
+    ) == pycountry.countries.search_fuzzy("UK")
+
+    with pytest.raises(ValueError):
+        pycountry.countries.search_fuzzy("Germny", max_distance=10)
+
+
+def test_country_fuzzy_search_typos_follow_entries(countries):
+    pycountry.countries.search_fuzzy("Germny", max_distance=1)
+    pycountry.countries.add_entry(
+        alpha_2="XK", alpha_3="XXK", name="Kosovo", numeric="926"
+    )
+    results = pycountry.countries.search_fuzzy("Kosuvo", max_distance=1)
+    assert results[0] == pycountry.countries.get(alpha_2="XK")
+
+    pycountry.countries.remove_entry(alpha_2="XK")
+    with pytest.raises(LookupError):
+        pycountry.countries.search_fuzzy("Kosuvo", max_distance=1)
+
+
+def test_subdivision_fuzzy_search_typos():
+    results = pycountry.subdivisions.search_fuzzy(
+        "Massachusets", max_distance=1
+    )
+    assert results[0] == pycountry.subdivisions.get(code="US-MA")
+
+
+@pytest.mark.parametrize(
+    "a, b, distance",
+    [
+        ("", "", 0),
+        ("", "abc", 3),
+        ("abc", "", 3),
+        ("germany", "germny", 1),
+        ("france", "frnace", 2),
+        ("kitten", "sitting", 3),
+        ("côte", "cote", 1),
+    ],
+)
+def test_levenshtein(a, b, distance):
+    assert pycountry.search.levenshtein(a, b) == distance
+    assert pycountry.search.levenshtein(b, a) == distance
+
+
+def test_bk_tree():
+    tree = pycountry.search.BKTree()
+    assert tree.search("foo", 1) == []
+    for word in ["germany", "france", "spain", "germania", "germany"]:
+        tree.add(word, word.upper())
+    assert len(tree) == 4
+    assert tree.search("germny", 1) == [
+        (1, "germany", "GERMANY"),
+        (1, "germany", "GERMANY"),
+    ]
+    assert [key for _, key, _ in tree.search("germanx", 2)] == [
+        "germany",
+        "germany",
+        "germania",
+    ]
+
+
+def test_language_fuzzy_search():
+    results = pycountry.languages.search_fuzzy("German")
+    assert results[0] == pycountry.languages.get(alpha_3="deu")
+    assert pycountry.languages.get(name="Low German") in results
+
+    # Common names are searched too.
+    results = pycountry.languages.search_fuzzy("Bangla")
+    assert results[0] == pycountry.languages.get(alpha_2="bn")
+
+    results = pycountry.languages.search_fuzzy("Germn", max_distance=1)
+    assert results == [pycountry.languages.get(alpha_3="deu")]
+
+    with pytest.raises(LookupError):
+        pycountry.languages.search_fuzzy("Klingonish")
+
+
+def test_currency_fuzzy_search():
+    results = pycountry.currencies.search_fuzzy("dollar")
+    assert results[0] == pycountry.currencies.get(alpha_3="USD")
+    assert pycountry.currencies.get(alpha_3="FJD") in results
+
+    # Exact matches on codes come first.
+    results = pycountry.currencies.search_fuzzy("eur")
+    assert results[0] == pycountry.currencies.get(alpha_3="EUR")
+
+
+def test_script_fuzzy_search():
+    results = pycountry.scripts.search_fuzzy("Cyrilic", max_distance=1)
+    assert results == [pycountry.scripts.get(alpha_4="Cyrl")]
+
+
+def test_search_index():
+    index = pycountry.search.SearchIndex()
+    index.add("GB", ["United Kingdom", None, "Britain"])
+    index.add("US", ["United States", "America"])
+    index.add("UA", ["Ukraine"])
+    assert index.order("US") == 1
+
+    assert index.partial_matches("united") == [("GB", 0), ("US", 0)]
+    assert index.partial_matches("in") == [("GB", 8), ("UA", 4)]
+    assert index.partial_matches("zz") == []
+    assert index.partial_matches("uk") == [("GB", None), ("UA", 0)]
+    assert index.partial_matches("uk", match_initials=False) == [("UA", 0)]
+    # The best ranking name is reported.
+    assert index.partial_matches("ri") == [("GB", 1), ("US", 3)]
+
+    assert index.typo_matches("amerika", 1) == [(1, "US")]
+    index.add("XK", ["Kosovo"])
+    assert index.typo_matches("kosuvo", 1) == [(1, "XK")]
+
+
+def test_iter_raw():
+    with open(pycountry.currencies.filename, encoding="utf-8") as f:
+        expected = json.load(f)["4217"]
+    assert list(pycountry.currencies.iter_raw()) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 4096])
+def test_iter_entries_chunks(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(pycountry.db, "CHUNK_SIZE", chunk_size)
+    filename = tmp_path / "db.json"
+    filename.write_text(
+        '{"other": {"a": [1, 2]}, "count": 12345 ,\n'
+        '"3166-1" : [ {"alpha_2": "XK", "name": "Kosovo"} ,\n'
+        '{"alpha_2": "XX", "numeric": 999},12345, 12345.5e3,-1.5E-2,'
+        ' true ] , "last": null}',
+        encoding="utf-8",
+    )
+    assert list(pycountry.db.iter_entries(str(filename), "3166-1")) == [
+        {"alpha_2": "XK", "name": "Kosovo"},
+        {"alpha_2": "XX", "numeric": 999},
+        12345,
+        12345.5e3,
+        -1.5e-2,
+        True,
+    ]
+
+
+@pytest.mark.parametrize(
+    "content, exception",
+    [
+        ('{"3166-1": []}', None),
+        ("{}", KeyError),
+        ('{"3166-2": []}', KeyError),
+        ("[]", json.JSONDecodeError),
+        ('{"3166-1": [{"alpha_2": "XK"} {}]}', json.JSONDecodeError),
+        ('{"3166-1": [{"alpha_2": "XK"', json.JSONDecodeError),
+    ],
+)
+def test_iter_entries_edge_cases(tmp_path, content, exception):
+    filename = tmp_path / "db.json"
+    filename.write_text(content, encoding="utf-8")
+    entries = pycountry.db.iter_entries(str(filename), "3166-1")
+    if exception is None:
+        assert list(entries) == []
+    else:
+        with pytest.raises(exception):
+            list(entries)
+
+
+def test_stream_load():
+    db = pycountry.Currencies(pycountry.currencies.filename)
+    db.stream_load = True
+    assert [dict(c) for c in db] == [dict(c) for c in pycountry.currencies]
+    assert db.get(numeric="978").alpha_3 == "EUR"
+
+
+def test_streamed_records_share_keys():
+    first, second = itertools.islice(pycountry.languages.iter_raw(), 2)
+    for key in first:
+        if key in second:
+            assert [k for k in second if k == key][0] is key
+
+
+@pytest.mark.parametrize("query", ["New", "Cote", "UK", "us", "Germny"])
+def test_country_fuzzy_search_limit(countries, query):
+    results = pycountry.countries.search_fuzzy(query, max_distance=1)
+    for limit in 1, 3, 5:
+        assert (
+            pycountry.countries.search_fuzzy(query, max_distance=1, limit=limit)
+            == results[:limit]
+        )
+
+
+def test_country_fuzzy_search_scored(countries):
+    results = pycountry.countries.search_fuzzy_scored("Cote")
+    assert [(c.alpha_2, points) for c, points in results] == [
+        ("CI", 30),
+        ("FR", 11),
+        ("HN", 4),
+    ]
+    with pytest.raises(ValueError):
+        pycountry.countries.search_fuzzy_scored("Cote", limit=0)
+
+
+@pytest.mark.parametrize("database", ["countries", "subdivisions", "languages"])
+@pytest.mark.parametrize("query", ["Germany", "Bavria", "new", "york"])
+def test_fuzzy_search_points_dont_depend_on_limit(database, query):
+    db = getattr(pycountry, database)
+    results = db.search_fuzzy_scored(query, max_distance=2)
+    for limit in 1, 2, 5:
+        assert db.search_fuzzy_scored(query, 2, limit) == results[:limit]
+
+
+def test_subdivision_fuzzy_search_limit():
+    results = pycountry.subdivisions.search_fuzzy("York")
+    assert len(results) > 2
+    assert pycountry.subdivisions.search_fuzzy("York", limit=2) == results[:2]
+
+
+def test_historic_country_fuzzy_search_only_returns_own_records():
+    for country in pycountry.historic_countries.search_fuzzy("new"):
+        assert isinstance(country, pycountry.historic_countries.data_class)
+        assert country in list(pycountry.historic_countries)
+
+
+def test_rank_skips_settled_tiers():
+    def never(*args):
+        raise AssertionError("tier should have been skipped")
+
+    def kept_only(matches):
+        # Skipped tiers are only searched for the kept candidates.
+        def search(records):
+            if records is None:
+                never()
+            return [match for match in matches if match[0] in records]
+
+        return search
+
+    tiers = [
+        (50, lambda records: [("a", 50), ("b", 10)]),
+        (5, lambda records: [("b", 5), ("c", 5)]),
+        (5, kept_only([("a", 5), ("c", 5)])),
+    ]
+    assert pycountry.search.rank(tiers, str, limit=1) == [("a", 55)]
+    assert pycountry.search.rank(tiers, str, limit=2) == [
+        ("a", 55),
+        ("b", 15),
+    ]
+    with pytest.raises(AssertionError):
+        pycountry.search.rank(tiers, str, limit=3)
+    with pytest.raises(AssertionError):
+        pycountry.search.rank(tiers, str)
+
+    # Bounds computed per query
+    tiers = [
+        (50, lambda records: [("a", 50), ("b", 10)]),
+        (lambda: 0, kept_only([])),
+        (never, never),
+    ]
+    assert pycountry.search.rank(tiers[:2], str, limit=3) == [
+        ("a", 50),
+        ("b", 10),
+    ]
+    with pytest.raises(AssertionError):
+        pycountry.search.rank(tiers, str, limit=1)
+
+
+def test_country_fuzzy_search_skips_settled_tiers(monkeypatch):
+    expected = pycountry.countries.search_fuzzy_scored("Germany", 1)[:1]
+
+    def kept_only(results):
+        def search(*args):
+            if args[-1] is None:
+                raise AssertionError("tier should have been skipped")
+            return results(*args)
+
+        return search
+
+    # Only the bounds of the subdivision tiers depend on the query: an exact
+    # match on a country name can't be beaten. The other tiers are searched
+    # for the points of the kept country only.
+    for name in "_partial_results", "_typo_results":
+        results = getattr(pycountry.countries, name)
+        monkeypatch.setattr(pycountry.countries, name, kept_only(results))
+    results = pycountry.countries.search_fuzzy_scored("Germany", 1, limit=1)
+    assert results == expected
+    assert [(c.alpha_2, points) for c, points in results] == [("DE", 80)]
+
+
+def test_country_fuzzy_search_subdivision_points():
+    # 49 points for an exact match on a subdivision name, 5 for the partial
+    # match of "Bayern" at its start
+    results = pycountry.countries.search_fuzzy_scored("Bayern")
+    assert [(c.alpha_2, points) for c, points in results] == [("DE", 54)]
+
+
+@pytest.fixture
+def cached_countries(countries):
+    countries.enable_cache(maxsize=3)
+    yield countries
+    countries.disable_cache()
+
+
+def test_result_cache(cached_countries):
+    c = cached_countries
+    assert c.cache_info() == (0, 0, 3, 0)
+
+    germany = c.lookup("DE")
+    assert c.lookup("de") is germany
+    assert c.cache_info() == (1, 1, 3, 1)
+
+    results = c.search_fuzzy("England")
+    # Queries are normalized and the cached list is not handed out.
+    results.append(None)
+    assert c.search_fuzzy(" england ") == [c.get(alpha_2="GB")]
+    # The search looked up the query, too.
+    assert c.cache_info() == (2, 3, 3, 3)
+    assert c.cache_info().hit_rate == 0.4
+
+    # Lookup errors are cached, too.
+    for _ in range(2):
+        with pytest.raises(LookupError, match="bogus"):
+            c.lookup("bogus")
+    assert c.cache_info() == (3, 4, 3, 3)
+
+    # The least recently used entries were dropped.
+    c.lookup("de")
+    assert c.cache_info().misses == 5
+
+    c.disable_cache()
+    assert c.cache_info() is None
+
+
+def test_result_cache_invalidation(cached_countries):
+    c = cached_countries
+    with pytest.raises(LookupError):
+        c.lookup("XK")
+    with pytest.raises(LookupError):
+        c.search_fuzzy("Utopia")
+
+    c.add_entry(alpha_2="XK", alpha_3="XXK", name="Utopia", numeric="926")
+    utopia = c.get(alpha_2="XK")
+    assert c.lookup("XK") is utopia
+    assert c.search_fuzzy("Utopia") == [utopia]
+
+    c.remove_entry(alpha_2="XK")
+    with pytest.raises(LookupError):
+        c.lookup("XK")
+
+
+def test_result_cache_follows_subdivisions(cached_countries):
+    c = cached_countries
+    with pytest.raises(LookupError):
+        c.search_fuzzy("Atlantis")
+    pycountry.subdivisions.add_entry(code="DE-AT", name="Atlantis", type="Land")
+    try:
+        assert c.search_fuzzy("Atlantis") == [c.get(alpha_2="DE")]
+    finally:
+        pycountry.subdivisions.remove_entry(code="DE-AT")
+
+
+def test_lru_cache():
+    with pytest.raises(ValueError):
+        pycountry.db.LRUCache(0)
+    cache = pycountry.db.LRUCache(1)
+    assert cache.info().hit_rate == 0.0
+    cache.put("a", 1, version=1)
+    assert cache.get("a", version=1) == 1
+    with pytest.raises(KeyError):
+        cache.get("a", version=2)
+
+
+def test_to_columns(countries):
+    columns = pycountry.countries.to_columns()
+    assert list(columns)[:3] == ["alpha_2", "alpha_3", "flag"]
+    assert len(columns["alpha_2"]) == len(pycountry.countries)
+    germany = columns["alpha_2"].index("DE")
+    assert columns["alpha_3"][germany] == "DEU"
+    aruba = columns["alpha_2"].index("AW")
+    assert columns["official_name"][aruba] is None
+
+    # The columns are cached, but the cache follows changes.
+    columns.clear()
+    assert pycountry.countries.to_columns()["alpha_2"][germany] == "DE"
+    pycountry.countries.remove_entry(alpha_2="DE")
+    assert "DE" not in pycountry.countries.to_columns()["alpha_2"]
+
+
+def test_to_columns_subdivisions():
+    columns = pycountry.subdivisions.to_columns()
+    de_st = columns["code"].index("DE-ST")
+    assert columns["country_code"][de_st] == "DE"
+
+
+def test_to_arrow(countries):
+    pyarrow = pytest.importorskip("pyarrow")
+    table = pycountry.countries.to_arrow()
+    assert isinstance(table, pyarrow.Table)
+    assert table.num_rows == len(pycountry.countries)
+    assert pycountry.countries.to_arrow() is table
+    assert table.column("alpha_2").to_pylist()[:2] == ["AW", "AF"]
+
+
+def test_to_pandas(countries):
+    pytest.importorskip("pandas")
+    df = pycountry.currencies.to_pandas()
+    assert len(df) == len(pycountry.currencies)
+    euro = df[df["alpha_3"] == "EUR"].iloc[0]
+    assert euro["numeric"] == "978"
+
+
+@pytest.mark.parametrize(
+    "method, module", [("to_arrow", "pyarrow"), ("to_pandas", "pandas")]
+)
+def test_columnar_export_requires_optional_dependency(
+    monkeypatch, method, module
+):
+    monkeypatch.setitem(sys.modules, module, None)
+    with pytest.raises(ImportError, match=module):
+        getattr(pycountry.scripts, method)()
+
+
+def test_get_numeric_as_int(countries):
+    germany = pycountry.countries.get(alpha_2="DE")
+    assert pycountry.countries.get(numeric=276) is germany
+    assert pycountry.countries.get(numeric=4).alpha_2 == "AF"
+    assert pycountry.currencies.get(numeric=978).alpha_3 == "EUR"
+    assert pycountry.countries.get(numeric=9999) is None
+    with pytest.raises(LookupError):
+        pycountry.countries.get(numeric=True)
+
+
+def test_convert(countries):
+    c = pycountry.countries
+    assert c.convert("DEU", "alpha_2") == "DE"
+    assert c.convert("de", "alpha_3") == "DEU"
+    assert c.convert(840, "alpha_2") == "US"
+    assert c.convert("004", "alpha_3") == "AFG"
+    assert c.convert("US", "numeric") == "840"
+    for unknown in "XX", "ZZZ", "D3", "", "1234", 1000, -1, True, None, "²":
+        assert c.convert(unknown, "alpha_2") is None
+    assert c.convert("XX", "alpha_2", default="?") == "?"
+    with pytest.raises(ValueError, match="alpha_4"):
+        c.convert("DE", "alpha_4")
+
+    assert pycountry.currencies.convert(978, "alpha_3") == "EUR"
+    with pytest.raises(ValueError):
+        pycountry.currencies.convert("EUR", "alpha_2")
+
+    # Historic countries may lack numeric codes.
+    assert pycountry.historic_countries.convert("YU", "alpha_3") == "YUG"
+    assert pycountry.historic_countries.convert("ANT", "numeric") == "530"
+
+    c.add_entry(alpha_2="XK", alpha_3="XXK", name="Kosovo")
+    assert c.convert("XK", "alpha_3") == "XXK"
+    assert c.convert("XK", "numeric", default="") == ""
+
+
+def test_convert_many(countries):
+    codes = ["DEU", "fr", 840, "004", "XXX", "fr", None]
+    assert pycountry.countries.convert_many(codes, "alpha_2", default="") == [
+        "DE",
+        "FR",
+        "US",
+        "AF",
+        "",
+        "FR",
+        "",
+    ]
+
+
+def test_code_table():
+    records = [{"a": "AB", "n": "001"}, {"a": "CD"}, {"a": "ab", "n": "002"}]
+    table = pycountry.codes.CodeTable(["a", "n", "missing"], records)
+    # Later records win.
+    assert table.record_no("AB") == 2
+    assert table.convert(1, "a") == "AB"
+    assert table.convert("CD", "n", default="-") == "-"
+    with pytest.raises(ValueError):
+        pycountry.codes.CodeTable(["a"], [{"a": "AB"}, {"a": "ABC"}])
+    with pytest.raises(ValueError):
+        pycountry.codes.CodeTable(["a"], [{"a": "ABCD"}])
+    with pytest.raises(ValueError):
+        pycountry.codes.CodeTable(["a"], [{"a": "A1"}, {"a": "AB"}])
+    assert pycountry.codes.pack_letters("ab") == pycountry.codes.pack_letters(
+        "AB"
+    )
+
+
+@pytest.fixture
+def fresh_subdivisions():
+    return pycountry.Subdivisions(pycountry.subdivisions.filename)
+
+
+def test_subdivisions_loaded_per_country(fresh_subdivisions):
+    subdivisions = fresh_subdivisions
+    german = subdivisions.get(country_code="DE")
+    assert len(german) == 16
+    bavaria = subdivisions.get(code="de-by")
+    assert bavaria.name == "Bayern"
+    assert bavaria in german
+    assert subdivisions.get(code="DE-XX") is None
+    assert subdivisions.get(country_code="AQ") == []
+    assert subdivisions.get(country_code="XX") is None
+    assert not subdivisions._is_loaded
+
+    # Loading everything keeps the records handed out so far.
+    assert len(subdivisions) == 5046
+    assert subdivisions.get(code="DE-BY") is bavaria
+    assert subdivisions.get(country_code="DE") == german
+
+
+@pytest.mark.parametrize("offsets", [None, '{"size": 1, "countries": {}}'])
+def test_subdivisions_without_offsets(fresh_subdivisions, tmp_path, offsets):
+    subdivisions = fresh_subdivisions
+    subdivisions.offsets_filename = str(tmp_path / "offsets.json")
+    if offsets is not None:
+        with open(subdivisions.offsets_filename, "w") as f:
+            f.write(offsets)
+    assert len(subdivisions.get(country_code="DE")) == 16
+    assert subdivisions._is_loaded
+
+
+def test_subdivision_offsets_match_database():
+    with open(pycountry.subdivisions.offsets_filename) as f:
+        offsets = json.load(f)
+    with open(pycountry.subdivisions.filename, "rb") as f:
+        data = f.read()
+    assert offsets["size"] == len(data)
+    total = 0
+    for country_code, (start, end) in offsets["countries"].items():
+        entries = json.loads(b"[" + data[start:end] + b"]")
+        assert {e["code"].split("-")[0] for e in entries} == {country_code}
+        total += len(entries)
+    assert total == len(pycountry.subdivisions)
+
+
+def test_convert_language_codes():
+    languages = pycountry.languages
+    assert languages.convert("ger", "alpha_2") == "de"
+    assert languages.convert("DEU", "bibliographic") == "ger"
+    assert languages.convert("de", "alpha_3") == "deu"
+    # Without a separate bibliographic code, it equals the terminology code.
+    assert languages.convert("en", "bibliographic") == "eng"
+    assert languages.convert("tib", "alpha_3") == "bod"
+    assert languages.convert("aaa", "alpha_2") is None
+    assert languages.convert_many(
+        ["fr", "fre", "fra", "xx", "sla", 1], "alpha_3", default=""
+    ) == ["fra", "fra", "fra", "", "", ""]
+
+    families = pycountry.language_families
+    assert families.convert_many(["SLA", "deu"], "alpha_3") == ["sla", None]
+
+
+def test_code_table_same_length_fields():
+    records = [{"t": "deu", "b": "ger"}, {"t": "ger"}, {"t": "fra"}]
+    table = pycountry.codes.CodeTable(["t", "b"], records, {"b": "t"})
+    # Fields are tried in order.
+    assert table.record_no("ger") == 1
+    assert table.convert("deu", "b") == "ger"
+    assert table.convert("fra", "b") == "fra"
+
+
+@pytest.mark.parametrize(
+    "tag, language, script, country, subdivision",
+    [
+        ("pt-BR", "por", None, "BR", None),
+        ("zh-Hant-TW", "zho", "Hant", "TW", None),
+        ("sr_Latn_RS", "srp", "Latn", "RS", None),
+        ("de_DE.UTF-8", "deu", None, "DE", None),
+        ("sr_RS@latin", "srp", None, "RS", None),
+        ("en-GB-u-sd-gbsct", "eng", None, "GB", "GB-SCT"),
+        ("EN-us-x-private", "eng", None, "US", None),
+        ("es-419", "spa", None, None, None),
+        ("es-724", "spa", None, "ES", None),
+        ("zh-yue-HK", "yue", None, "HK", None),
+        ("ger", "deu", None, None, None),
+        ("de-Xxxx-XX", "deu", None, None, None),
+    ],
+)
+def test_resolve_language_tag(tag, language, script, country, subdivision):
+    result = pycountry.language_tags.resolve(tag)
+    assert result.language.alpha_3 == language
+    assert getattr(result.script, "alpha_4", None) == script
+    assert getattr(result.country, "alpha_2", None) == country
+    assert getattr(result.subdivision, "code", None) == subdivision
+
+
+@pytest.mark.parametrize("tag", ["", "*", "x-foo", "xx-DE", "1234", None])
+def test_resolve_invalid_language_tag(tag):
+    with pytest.raises(LookupError):
+        pycountry.language_tags.resolve(tag)
+
+
+def test_language_tags_cache():
+    tags = pycountry.tags.LanguageTags(
+        pycountry.languages,
+        pycountry.scripts,
+        pycountry.countries,
+        pycountry.subdivisions,
+        maxsize=2,
+    )
+    assert tags.resolve("de-DE") is tags.resolve("DE_de")
+    with pytest.raises(LookupError):
+        tags.resolve("xx")
+    with pytest.raises(LookupError):
+        tags.resolve("xx")
+    assert tags.cache_info() == (2, 2, 2, 2)
+
+    results = tags.resolve_many(["pt-BR", "pt-BR", "xx", [], "de"], "-")
+    assert results[0] is results[1]
+    assert results[0].country.alpha_2 == "BR"
+    assert results[2:4] == ["-", "-"]
+    assert results[4].language.alpha_2 == "de"
+
+
+@pytest.mark.parametrize(
+    "code, current, historic",
+    [
+        ("BUMM", ["MM"], "BUMM"),
+        ("bur", ["MM"], "BUMM"),
+        ("DDR", ["DE"], "DDDE"),
+        (278, ["DE"], "DDDE"),
+        ("BYAA", ["BY"], "BYAA"),
+        ("FQHH", ["AQ", "TF"], "FQHH"),
+        ("PCHH", ["FM", "MH", "MP", "PW"], "PCHH"),
+        # Countries that split up
+        ("ANHH", ["BQ", "CW", "SX"], "ANHH"),
+        ("CSHH", ["CZ", "SK"], "CSHH"),
+        ("GEHH", ["KI", "TV"], "GEHH"),
+        (
+            "SU",
+            [
+                "AM",
+                "AZ",
+                "BY",
+                "EE",
+                "GE",
+                "KG",
+                "KZ",
+                "LT",
+                "LV",
+                "MD",
+                "RU",
+                "TJ",
+                "TM",
+                "UA",
+                "UZ",
+            ],
+            "SUHH",
+        ),
+        # Later withdrawals take precedence.
+        ("CS", ["RS", "ME"], "CSXX"),
+        # Followed through Serbia and Montenegro
+        ("YU", ["RS", "ME", "BA", "HR", "MK", "SI"], "YUCS"),
+        # Current codes take precedence.
+        ("BY", ["BY"], None),
+        ("104", ["MM"], None),
+        ("DEU", ["DE"], None),
+    ],
+)
+def test_resolve_historic_codes(code, current, historic):
+    resolution = pycountry.historic_countries.resolve(code)
+    assert [c.alpha_2 for c in resolution.current] == current
+    assert getattr(resolution.historic, "alpha_4", None) == historic
+
+
+def test_resolve_many_historic_codes(countries):
+    h = pycountry.historic_countries
+    assert h.resolve("XX") is None
+    results = h.resolve_many(["YU", "XX", None, 276], default="?")
+    assert results[0].historic.alpha_3 == "YUG"
+    assert results[1:3] == ["?", "?"]
+    assert results[3].current == (countries.get(alpha_2="DE"),)
+
+    # The index follows changes of the current countries.
+    countries.add_entry(alpha_2="XK", alpha_3="XKX", name="Kosovo")
+    assert h.resolve("xk").current[0].name == "Kosovo"
+
+
+def _has_fts5():
+    import sqlite3
+
+    try:
+        sqlite3.connect(":memory:").execute(
+            "CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')"
+        )
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+requires_fts5 = pytest.mark.skipif(
+    not _has_fts5(), reason="SQLite lacks FTS5 with the trigram tokenizer"
+)
+
+
+@pytest.fixture
+def sqlite_databases(monkeypatch):
+    import pycountry.sqlite
+
+    # Searches on countries consider the subdivisions of the module.
+    subdivisions = pycountry.sqlite.sqlite_database(pycountry.subdivisions)
+    monkeypatch.setattr(pycountry, "subdivisions", subdivisions)
+    countries = pycountry.sqlite.sqlite_database(pycountry.countries)
+    languages = pycountry.sqlite.sqlite_database(pycountry.languages)
+    return countries, subdivisions, languages
+
+
+@requires_fts5
+def test_sqlite_backend(sqlite_databases):
+    countries, subdivisions, languages = sqlite_databases
+    assert type(countries).__name__ == "SQLiteExistingCountries"
+    assert len(countries) == 249
+    assert [c._fields for c in countries] == [
+        c._fields for c in pycountry.countries
+    ]
+    germany = countries.get(alpha_2="de")
+    assert germany.name == "Germany"
+    assert countries.get(numeric=276) is germany
+    assert countries.lookup("Federal Republic of Germany") is germany
+    assert countries.get(alpha_2="XX") is None
+    with pytest.raises(KeyError):
+        countries.get(foo="bar")
+    with pytest.raises(LookupError):
+        countries.lookup("Atlantis")
+    assert countries.convert("DEU", "alpha_2") == "DE"
+    assert countries.to_columns()["alpha_2"][:2] == ("AW", "AF")
+    assert countries.objects[1].alpha_2 == "AF"
+    assert countries.objects[-1] is countries.objects[248]
+    assert [c.alpha_2 for c in countries.objects[:2]] == ["AW", "AF"]
+    with pytest.raises(IndexError):
+        countries.objects[249]
+    assert len(countries.indices["alpha_2"]) == 249
+    assert "de" in countries.indices["alpha_2"]
+    assert sorted(countries.indices["alpha_2"])[:2] == ["ad", "ae"]
+
+    assert len(subdivisions.get(country_code="DE")) == 16
+    assert subdivisions.get(country_code="AQ") == []
+    assert subdivisions.get(code="DE-BY").name == "Bayern"
+    assert subdivisions.lookup("Bayern").code == "DE-BY"
+    in_memory = pycountry.Subdivisions(subdivisions.filename)
+    assert [s._fields for s in subdivisions.partial_match("ba")] == [
+        s._fields for s in in_memory.partial_match("ba")
+    ]
+
+    # Values of fields that aren't indexed
+    assert languages.lookup("Bangla").alpha_3 == "ben"
+
+    with pytest.raises(TypeError):
+        countries.add_entry(alpha_2="XK", alpha_3="XKX", name="Kosovo")
+    with pytest.raises(TypeError):
+        countries.remove_entry(alpha_2="DE")
+    assert countries.freeze() == (0, 0)
+
+
+@requires_fts5
+@pytest.mark.parametrize(
+    "name, query, max_distance",
+    [
+        ("countries", "England", 0),
+        ("countries", "Sint Maarten", 0),
+        ("countries", "uk", 0),
+        ("countries", "Bayern", 0),
+        ("countries", "germny", 1),
+        ("countries", "Nordrhein", 2),
+        ("subdivisions", "Alabama", 0),
+        ("subdivisions", "Bayrn", 1),
+        ("languages", "Bangla", 0),
+        ("languages", "ger", 0),
+        ("languages", "Gernan", 1),
+    ],
+)
+def test_sqlite_backend_fuzzy_search(
+    sqlite_databases, monkeypatch, name, query, max_distance
+):
+    db = dict(
+        zip(["countries", "subdivisions", "languages"], sqlite_databases)
+    )[name]
+    results = [
+        (record._fields, points)
+        for record, points in db.search_fuzzy_scored(query, max_distance)
+    ]
+    monkeypatch.undo()
+    expected = [
+        (record._fields, points)
+        for record, points in getattr(pycountry, name).search_fuzzy_scored(
+            query, max_distance
+        )
+    ]
+    assert results == expected
+
+
+@requires_fts5
+def test_sqlite_backend_threads(sqlite_databases):
+    import concurrent.futures
+
+    countries = sqlite_databases[0]
+    germany = countries.get(alpha_2="DE")
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        results = list(
+            pool.map(lambda _: countries.get(alpha_3="DEU"), range(20))
+        )
+    # Records are shared as long as they are in use.
+    assert all(result is germany for result in results)
+
+
+@requires_fts5
+def test_sqlite_build(tmp_path):
+    import sqlite3
+
+    import pycountry.sqlite
+
+    filename = str(tmp_path / "test.sqlite")
+    pycountry.sqlite.build(filename, [pycountry.scripts])
+    scripts = pycountry.sqlite.sqlite_database(pycountry.scripts, filename)
+    assert scripts.get(alpha_4="Latn").name == "Latin"
+    assert list(scripts.iter_raw()) == list(pycountry.scripts.iter_raw())
+    assert len(scripts.indices["alpha_4"]) == len(pycountry.scripts)
+
+    # The packaged file is up to date.
+    conn = sqlite3.connect(pycountry.sqlite.SQLITE_FILENAME)
+    rows = conn.execute(
+        "SELECT data FROM records WHERE db = '15924' ORDER BY record_no"
+    ).fetchall()
+    assert [json.loads(data) for data, in rows] == list(
+        pycountry.scripts.iter_raw()
+    )
+
+
+def test_cli_convert_csv(tmp_path, capsys):
+    src = tmp_path / "in.csv"
+    src.write_text("id,country\n1,DE\n2,Germany\n3,fr\n4,Atlantis\n5,DE\n")
+    dst = tmp_path / "out.csv"
+    assert (
+        pycountry.__main__.main(
+            ["convert", str(src), "-o", str(dst), "-c", "country"]
+            + ["--to", "alpha_3", "--output-column", "iso", "--default", "?"]
+        )
+        == 0
+    )
+    assert dst.read_text().splitlines() == [
+        "id,country,iso",
+        "1,DE,DEU",
+        "2,Germany,DEU",
+        "3,fr,FRA",
+        "4,Atlantis,?",
+        "5,DE,DEU",
+    ]
+    assert "Converted 5 rows" in capsys.readouterr().err
+
+    args = ["convert", str(src), "-o", str(dst), "-c", "x", "-t", "alpha_2"]
+    assert pycountry.__main__.main(args + ["-j", "2"]) == 1
+    assert "Column 'x' not found" in capsys.readouterr().err
+
+    # Unknown fields fail before writing anything.
+    dst.unlink()
+    args = ["convert", str(src), "-o", str(dst), "-c", "country"]
+    assert pycountry.__main__.main(args + ["-t", "alpah_2"]) == 1
+    assert "Field 'alpah_2' not found" in capsys.readouterr().err
+    args += ["-m", "get", "--field", "alpah_2", "-t", "name"]
+    assert pycountry.__main__.main(args) == 1
+    assert "Field 'alpah_2' is not indexed" in capsys.readouterr().err
+    assert not dst.exists()
+
+
+def test_cli_convert_jsonl(tmp_path, monkeypatch, capsys):
+    lines = ['{"c": 276}', '{"c": "978"}', "", '{"c": null}', '{"x": 1}']
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines)))
+    args = ["convert", "-", "--format", "jsonl", "-c", "c", "-t", "alpha_3"]
+    args += ["-d", "currencies", "-m", "get", "--field", "numeric"]
+    assert pycountry.__main__.main(args) == 0
+    out = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert out == [
+        {"c": ""},
+        {"c": "EUR"},
+        {"c": ""},
+        {"x": 1, "c": ""},
+    ]
+
+    # Values that are neither strings nor integers don't match.
+    lines = ['{"c": ["DE"]}', '{"c": {"a": 1}}', '{"c": true}', '{"c": "DE"}']
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines)))
+    args = ["convert", "-", "--format", "jsonl", "-c", "c", "-t", "alpha_3"]
+    assert pycountry.__main__.main(args + ["--default", "?"]) == 0
+    out = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [row["c"] for row in out] == ["?", "?", "?", "DEU"]
+
+    # Lines that aren't JSON objects fail with the line number.
+    for lines, error in [
+        (['{"c": "DE"}', "", "[1]"], "Line 3: not a JSON object"),
+        (["[", '{"c": "DE"}', "]"], "Line 1: invalid JSON"),
+    ]:
+        monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines)))
+        assert pycountry.__main__.main(args) == 1
+        assert error in capsys.readouterr().err
+
+    # JSON documents aren't taken for JSON lines.
+    src = tmp_path / "in.json"
+    src.write_text('[{"c": "DE"}]')
+    args = ["convert", str(src), "-c", "c", "-t", "alpha_3"]
+    assert pycountry.__main__.main(args) == 1
+    assert "only JSON lines" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("option", ["--jobs", "--chunk-size"])
+@pytest.mark.parametrize("value", ["0", "-1", "x"])
+def test_cli_convert_rejects_non_positive_numbers(option, value, capsys):
+    args = ["convert", "-", "-c", "c", "-t", "alpha_2", option, value]
+    with pytest.raises(SystemExit):
+        pycountry.__main__.main(args)
+    assert option in capsys.readouterr().err
+
+
+def test_cli_convert_in_parallel(tmp_path, capsys):
+    src = tmp_path / "in.jsonl"
+    names = ["Germany", "Frnace", "Untied Kingdom", "Xyz"] * 5
+    src.write_text("".join(json.dumps({"name": n}) + "\n" for n in names))
+    dst = tmp_path / "out.jsonl"
+    args = ["convert", str(src), "-o", str(dst), "-c", "name", "-t"]
+    args += ["alpha_2", "-m", "search_fuzzy", "--max-distance", "2"]
+    args += ["-j", "2", "--chunk-size", "3"]
+    assert pycountry.__main__.main(args) == 0
+    out = [json.loads(line)["name"] for line in dst.read_text().splitlines()]
+    assert out == ["DE", "FR", "GB", ""] * 5
+    assert "4 distinct values" in capsys.readouterr().err
+
+
+def test_serve_endpoints():
+    server = pycountry.serve.Server()
+
+    def request(target, body=None):
+        method = "GET" if body is None else "POST"
+        status, data = server.respond(method, target, json.dumps(body).encode())
+        return status, json.loads(data)
+
+    assert request("/countries/get?alpha_2=de") == (
+        200,
+        dict(pycountry.countries.get(alpha_2="DE")),
+    )
+    assert request("/countries/lookup?value=DEU")[1]["alpha_2"] == "DE"
+    status, results = request(
+        "/countries/search_fuzzy?query=Gremany&max_distance=2&limit=1"
+    )
+    assert [r["alpha_2"] for r in results] == ["DE"]
+    status, results = request("/subdivisions/get?country_code=AD")
+    assert [r["code"] for r in results][:2] == ["AD-02", "AD-03"]
+    assert request("/subdivisions/get?country_code=AQ") == (200, [])
+    assert request("/countries/translate?locale=de&text=Germany") == (
+        200,
+        {"text": "Deutschland"},
+    )
+
+    assert request("/countries/get?alpha_2=XX")[0] == 404
+    assert request("/countries/translate?locale=xx&text=Germany")[0] == 404
+    assert request("/nothing/get?alpha_2=DE")[0] == 404
+    assert request("/countries/frobnicate?value=DE")[0] == 404
+    assert request("/subdivisions/get?name=Bayern")[0] == 400
+    assert request("/countries/get?alpha_2=DE&alpha_3=DEU")[0] == 400
+    assert request("/countries/get?default=x")[0] == 400
+    assert request("/countries/search_fuzzy?query=x&limit=y")[0] == 400
+    assert request("/countries/search_fuzzy?query=x&limit=0")[0] == 400
+    assert request("/countries/search_fuzzy?query=x&max_distance=4")[0] == 400
+    assert request("/countries/batch")[0] == 405
+
+    assert request(
+        "/currencies/batch",
+        {"method": "lookup", "values": ["EUR", "usd", 978, "EUR", "xx"]},
+    ) == (
+        200,
+        {
+            "results": [
+                dict(pycountry.currencies.get(alpha_3="EUR")),
+                dict(pycountry.currencies.get(alpha_3="USD")),
+                None,
+                dict(pycountry.currencies.get(alpha_3="EUR")),
+                None,
+            ]
+        },
+    )
+    status, data = request(
+        "/countries/batch",
+        {"method": "get", "field": "numeric", "values": [276, "250", "999"]},
+    )
+    assert [r and r["alpha_2"] for r in data["results"]] == ["DE", "FR", None]
+    assert request(
+        "/languages/batch",
+        {"method": "translate", "locale": "fr", "values": ["German", 1]},
+    ) == (200, {"results": ["Allemand", None]})
+    assert request("/countries/batch", {"method": "x", "values": []})[0] == 400
+    assert request("/countries/batch", {"method": "get"})[0] == 400
+    for params in [
+        {"method": "get"},
+        {"method": "get", "field": "unknown"},
+        {"method": "get", "field": "default"},
+        {"method": "search_fuzzy", "limit": -1},
+        {"method": "translate"},
+    ]:
+        assert (
+            request("/countries/batch", {**params, "values": ["x"]})[0] == 400
+        )
+    assert request(
+        "/countries/batch",
+        {"method": "search_fuzzy", "values": ["Frnace", "Xyzzy", None]},
+    ) == (200, {"results": [[], [], []]})
+    assert request("/metrics", {})[0] == 405
+    assert request("/countries/lookup", {})[0] == 405
+    assert request("/countries/lookup")[0] == 400
+
+    status, metrics = request("/metrics")
+    assert status == 200
+    assert metrics["/countries/get"]["count"] == 4
+    assert metrics["/countries/get"]["errors"] == 3
+    assert metrics["/currencies/batch"]["count"] == 1
+    # Requests for unknown endpoints are counted together.
+    assert metrics["other"]["count"] == 2
+
+
+def test_serve_keep_alive():
+    async def exchange():
+        server = pycountry.serve.Server(idle_timeout=5)
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        async def request(head, body=b""):
+            writer.write(head.encode() + b"\r\n\r\n" + body)
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            data = await reader.readexactly(int(headers["content-length"]))
+            return status, headers["connection"], json.loads(data)
+
+        responses = [
+            await request("GET /countries/get?alpha_2=DE HTTP/1.1"),
+            await request(
+                "POST /countries/batch HTTP/1.1\r\nContent-Length: 48",
+                b'{"method": "lookup", "values": ["FR", "Narnia"]}',
+            ),
+            await request(
+                "GET /scripts/lookup?value=Latn HTTP/1.1\r\nConnection: close"
+            ),
+        ]
+        # The server closed the connection as asked.
+        assert await reader.read() == b""
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return responses
+
+    responses = asyncio.run(exchange())
+    assert [(status, connection) for status, connection, _ in responses] == [
+        (200, "keep-alive"),
+        (200, "keep-alive"),
+        (200, "close"),
+    ]
+    assert responses[0][2]["name"] == "Germany"
+    assert [r and r["alpha_2"] for r in responses[1][2]["results"]] == [
+        "FR",
+        None,
+    ]
+    assert responses[2][2]["name"] == "Latin"
+
+
+def test_serve_slow_requests_dont_block_others():
+    class SlowServer(pycountry.serve.Server):
+        def respond(self, method, target, body):
+            if target.startswith("/slow"):
+                time.sleep(0.5)
+            return super().respond(method, target, body)
+
+    async def exchange():
+        server = SlowServer({"countries": pycountry.countries}, idle_timeout=5)
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        finished = []
+
+        async def send(target):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {target} HTTP/1.0\r\n\r\n".encode())
+            await reader.read()
+            finished.append(target)
+            writer.close()
+
+        slow = asyncio.create_task(send("/slow"))
+        await asyncio.sleep(0.1)
+        await send("/countries/get?alpha_2=DE")
+        await slow
+        listener.close()
+        await listener.wait_closed()
+        return finished
+
+    assert asyncio.run(exchange()) == ["/countries/get?alpha_2=DE", "/slow"]
+
+
+def test_serve_invalid_requests():
+    async def send(port, data):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(data)
+        response = await reader.read()
+        writer.close()
+        return response.split(b"\r\n")[0], response.split(b"\r\n\r\n")[1]
+
+    async def exchange():
+        server = pycountry.serve.Server(
+            {"countries": pycountry.countries}, idle_timeout=5
+        )
+        server.preload()
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        responses = [
+            # HTTP/1.0 closes the connection by default.
+            await send(port, b"GET /countries/get?alpha_2=FR HTTP/1.0\r\n\r\n"),
+            await send(port, b"HELLO\r\n\r\n"),
+            await send(
+                port,
+                b"POST /countries/batch HTTP/1.1\r\n"
+                b"Content-Length: 9999999\r\n\r\n",
+            ),
+            await send(
+                port,
+                b"POST /countries/batch HTTP/1.1\r\n"
+                b"Content-Length: many\r\n\r\n",
+            ),
+            await send(port, b"GET /" + b"x" * 70000 + b" HTTP/1.1\r\n\r\n"),
+            await send(
+                port,
+                b"GET /countries/get?alpha_2=FR HTTP/1.1\r\n"
+                b"X-Long: " + b"x" * 70000 + b"\r\n\r\n",
+            ),
+        ]
+        listener.close()
+        await listener.wait_closed()
+        return responses
+
+    responses = asyncio.run(exchange())
+    assert responses[0][0] == b"HTTP/1.1 200 OK"
+    assert json.loads(responses[0][1])["name"] == "France"
+    assert [status for status, _ in responses[1:]] == [
+        b"HTTP/1.1 400 Bad Request",
+        b"HTTP/1.1 413 Payload Too Large",
+        b"HTTP/1.1 400 Bad Request",
+        b"HTTP/1.1 414 URI Too Long",
+        b"HTTP/1.1 400 Bad Request",
+    ]
+
+
+def test_freeze(fresh_subdivisions):
+    subdivisions = fresh_subdivisions
+    bavaria = subdivisions.get(code="DE-BY")
+    report = subdivisions.freeze()
+    assert report.after < report.before
+    assert report.saved == report.before - report.after
+    assert subdivisions.memory_usage() == report.after
+
+    # Repeated values are shared.
+    berlin = subdivisions.get(code="DE-BE")
+    assert bavaria.type is berlin.type
+    assert bavaria.country_code is berlin.country_code
+    assert bavaria.country_code is bavaria._fields["country_code"]
+
+    assert subdivisions.get(code="de-by") is bavaria
+    assert subdivisions.lookup("Bayern") is bavaria
+    assert len(subdivisions.get(country_code="DE")) == 16
+    assert subdivisions.search_fuzzy("Bayrn", 1)[0] is bavaria
+
+    with pytest.raises(TypeError):
+        subdivisions.add_entry(code="DE-XX", name="Nowhere", type="Land")
+    with pytest.raises(TypeError):
+        subdivisions.remove_entry(code="DE-BY")
+    assert len(subdivisions) == 5046
+
+
+def test_freeze_shares_index_keys():
+    languages = pycountry.Languages(pycountry.languages.filename)
+    languages.freeze()
+    german = languages.get(alpha_3="deu")
+    # Lowercase codes are their own index keys.
+    (key,) = [key for key in languages.indices["alpha_3"] if key == "deu"]
+    assert key is german.alpha_3
+    assert languages.lookup("German") is german
+
+
+def test_to_json_bytes(countries):
+    germany = countries.get(alpha_2="DE")
+    assert germany.to_dict() == dict(germany)
+    assert json.loads(germany.to_json_bytes()) == dict(germany)
+
+    data = countries.to_json_bytes(germany)
+    assert json.loads(data) == dict(germany)
+    # Cached
+    assert countries.to_json_bytes(germany) is data
+
+    french = countries.to_dict(germany, "fr")
+    assert french["name"] == "Allemagne"
+    assert french["official_name"] == "République fédérale d'Allemagne"
+    assert french["alpha_2"] == "DE"
+    assert json.loads(countries.to_json_bytes(germany, "fr")) == french
+    with pytest.raises(LookupError):
+        countries.to_json_bytes(germany, "xx")
+
+    # Translations are looked up in the database's domain.
+    currencies = pycountry.currencies
+    euro = currencies.get(alpha_3="EUR")
+    assert json.loads(currencies.to_json_bytes(euro, "de"))["name"] == "Euro"
+
+
+def test_dump_json_bytes(countries):
+    data = countries.dump_json_bytes()
+    assert json.loads(data) == [dict(country) for country in countries]
+    assert countries.dump_json_bytes() is data
+    assert json.loads(countries.dump_json_bytes("de", alpha_2="de")) == [
+        countries.to_dict(countries.get(alpha_2="DE"), "de")
+    ]
+    with pytest.raises(LookupError):
+        countries.dump_json_bytes(alpha_2="XX")
+
+    subdivisions = pycountry.subdivisions
+    andorra = json.loads(subdivisions.dump_json_bytes(country_code="AD"))
+    assert [s["code"] for s in andorra] == [
+        s.code for s in subdivisions if s.country_code == "AD"
+    ]
+    assert subdivisions.dump_json_bytes(country_code="AQ") == b"[]"
+
+    # Adding and removing entries invalidates the cached data.
+    countries.add_entry(alpha_2="XK", alpha_3="XKX", name="Kosovo")
+    kosovo = countries.get(alpha_2="XK")
+    data = countries.dump_json_bytes()
+    assert json.loads(data)[-1] == dict(kosovo)
+    countries.remove_entry(alpha_2="XK")
+    assert json.loads(countries.dump_json_bytes())[-1]["alpha_2"] == "ZW"
+
+
+def test_json_cache_is_bounded():
+    class Currencies(pycountry.Currencies):
+        json_cache_size = 2
+
+    currencies = Currencies(pycountry.currencies.filename)
+    euro, dollar, yen = [
+        currencies.get(alpha_3=c) for c in ("EUR", "USD", "JPY")
+    ]
+    data = currencies.to_json_bytes(euro)
+    assert currencies.to_json_bytes(euro) is data
+    currencies.to_json_bytes(dollar)
+    currencies.to_json_bytes(yen)
+    assert currencies._json.info().currsize == 2
+    # Dropped and encoded again
+    assert currencies.to_json_bytes(euro) is not data
+    assert currencies.to_json_bytes(euro) == data